@@ -2,9 +2,9 @@ import streamlit as st
 import asyncio
 import os
 import nest_asyncio
-import atexit
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from services.chat_service import init_session
-from utils.async_helpers import on_shutdown
+from services.session_registry import session_registry
 from apps import mcp_playground
 
 # Apply nest_asyncio to allow nested asyncio event loops (needed for Streamlit's execution model)
@@ -25,16 +25,20 @@ with open(os.path.join('.', '.streamlit', 'style.css')) as f:
 
 
 def main():
+    # Report activity to the session registry; idle sessions are reaped in the background
+    # and the registry closes every session's connections at process exit.
+    ctx = get_script_run_ctx()
+    st.session_state.loop_lock = session_registry.touch(ctx.session_id, ctx.session_state)
+
     # Initialize session state for event loop
     if "loop" not in st.session_state:
         st.session_state.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(st.session_state.loop)
     
-    # Register shutdown handler
-    atexit.register(on_shutdown)
-    
     # Initialize the primary application
     init_session()
+    if st.session_state.pop("session_expired", False):
+        st.info("This session was idle for too long and its connections were closed. Reconnect to dbt MCP to continue.")
     mcp_playground.main()
 
 if __name__ == "__main__":
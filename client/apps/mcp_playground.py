@@ -1,14 +1,95 @@
 import os
 import datetime
+import pandas as pd
 import streamlit as st
 import json
 from services.mcp_service import run_agent
-from services.chat_service import get_current_chat, _append_message_to_session
+from services.chat_service import get_current_chat, _append_message_to_session, _replace_message_in_session
 from utils.async_helpers import run_async
 from utils.ai_prompts import make_system_prompt, make_main_prompt
 import ui_components.sidebar_components as sd_compents
 import traceback
 
+
+def _request_refresh(question, index):
+    st.session_state["refresh_request"] = {"question": question, "index": index}
+
+
+def _render_cached_badge(message, index):
+    """Mark an answer served from the answer cache and offer to recompute it."""
+    cached_at = datetime.datetime.fromtimestamp(message["cached_at"]).strftime("%Y-%m-%d %H:%M")
+    c1, c2 = st.columns([4, 1])
+    c1.caption(f"⚡ Cached answer from {cached_at}")
+    c2.button(
+        "🔄 Refresh",
+        key=f"refresh-cached-{index}",
+        on_click=_request_refresh,
+        args=(message["question"], index),
+        use_container_width=True,
+    )
+
+def _response_message(response, question):
+    """Assistant chat message for an agent response, with the tools used listed inline."""
+    formatted_response = response.get('output', '')
+    if response.get('tool_executions'):
+        tools_summary = "\n\n---\n**🛠️ dbt Tools Used:**\n\n"
+        for i, exec in enumerate(response['tool_executions'], 1):
+            tool_name = exec.get('tool_name', 'unknown')
+            tools_summary += f"**{i}**. {tool_name}\n"
+
+        formatted_response = formatted_response + tools_summary
+
+    response_dct = {"role": "assistant", "content": formatted_response}
+    charts = [ex["series"] for ex in response.get("tool_executions", []) if ex.get("series")]
+    if charts:
+        response_dct["charts"] = charts
+    if response.get("cached"):
+        response_dct.update(cached=True, cached_at=response["cached_at"], question=question)
+    return response_dct
+
+def _refresh_cached_answer(refresh, api_key):
+    """Recompute a cached answer as a standalone question and replace it in place.
+
+    Running it without the chat history keeps the stale answer out of the model's
+    context and lets run_agent store the fresh answer in the cache.
+    """
+    messages = st.session_state["messages"]
+    index = refresh["index"]
+    if index >= len(messages) or messages[index].get("question") != refresh["question"]:
+        return
+    with st.spinner("Refreshing the cached answer…", show_time=True):
+        response = run_async(run_agent(
+            st.session_state.client, refresh["question"], api_key, use_cache=False, history=[],
+        ))
+    if response.get("error"):
+        st.error(response["output"])
+        return
+    _replace_message_in_session(
+        index, _response_message(response, refresh["question"]), tool_executions=response.get("tool_executions"),
+    )
+    st.rerun()
+
+def _render_charts(charts, index):
+    """Downsampled time-series charts, with the full-resolution data available for download."""
+    for j, chart in enumerate(charts):
+        # Rows arrive in long format from the post-processing workers
+        time_col = chart["time_col"]
+        df = pd.DataFrame.from_records(chart["rows"])
+        df[time_col] = pd.to_datetime(df[time_col])
+        st.line_chart(df, x=time_col, y="value", color="series")
+        st.caption(f"Chart shows {chart['points']} of {chart['full_row_count']} rows (downsampled)")
+        if "full_csv" in chart:
+            st.download_button(
+                "⬇️ Download full data (CSV)",
+                data=chart["full_csv"],
+                file_name="query_metrics.csv",
+                mime="text/csv",
+                key=f"download-series-{index}-{j}",
+            )
+        else:
+            # The answer cache keeps charts but not the full-resolution data
+            st.caption("Refresh the answer to download the full data.")
+
 def main():
     # List available dbt tools (if connected) before chat section
     if st.session_state.get('tools'):
@@ -36,12 +117,16 @@ def main():
     # Re-render previous messages
     if st.session_state.get('current_chat_id'):
         st.session_state["messages"] = get_current_chat(st.session_state['current_chat_id'])
-        for m in st.session_state["messages"]:
+        for i, m in enumerate(st.session_state["messages"]):
             with messages_container.chat_message(m["role"]):
                 if "tool" in m and m["tool"]:
                     st.code(m["tool"], language='yaml')
                 if "content" in m and m["content"]:
                     st.markdown(m["content"])
+                if m.get("charts"):
+                    _render_charts(m["charts"], i)
+                if m.get("cached"):
+                    _render_cached_badge(m, i)
 
     # Readiness gating
     is_connected = bool(st.session_state.get("client"))
@@ -71,6 +156,14 @@ def main():
     # 4. Chat history along with the new chat and delete chat buttons
     sd_compents.create_chat_history_section()
 
+    # 5. Live sessions admin view (only when ADMIN_VIEW_ENABLED is set)
+    sd_compents.create_admin_sessions_widget()
+
+    # "Refresh" on a cached answer recomputes it in place, skipping the cache
+    refresh = st.session_state.pop("refresh_request", None)
+    if refresh and is_ready and user_text is None:
+        _refresh_cached_answer(refresh, api_key)
+
     # Main Logic
     if user_text is None:
         st.stop()
@@ -96,22 +189,20 @@ def main():
             try:
                 # If MCP client is connected, use OpenAI function-calling workflow
                 if st.session_state.get('client'):
-                    response = run_async(run_agent(st.session_state.client, user_text, params.get('api_key')))
+                    response = run_async(run_agent(
+                        st.session_state.client, user_text, params.get('api_key'),
+                    ))
 
                     # Format tool executions inline with the response
-                    formatted_response = response.get('output', '')
-                    if response.get('tool_executions'):
-                        tools_summary = "\n\n---\n**🛠️ dbt Tools Used:**\n\n"
-                        for i, exec in enumerate(response['tool_executions'], 1):
-                            tool_name = exec.get('tool_name', 'unknown')
-                            tools_summary += f"**{i}**. {tool_name}\n"
-                        
-                        formatted_response = formatted_response + tools_summary
+                    response_dct = _response_message(response, user_text)
 
                     # Display assistant reply with integrated tool summary
                     with messages_container.chat_message("assistant"):
-                        st.markdown(formatted_response)
-                    response_dct = {"role": "assistant", "content": formatted_response}
+                        st.markdown(response_dct["content"])
+                        if response_dct.get("charts"):
+                            _render_charts(response_dct["charts"], len(st.session_state["messages"]))
+                        if response_dct.get("cached"):
+                            _render_cached_badge(response_dct, len(st.session_state["messages"]))
                 
                 # Fall back to regular stream response if agent not available
                 else:
@@ -125,8 +216,8 @@ def main():
                     st.code(traceback.format_exc(), language="python")
                 st.stop()
                 
-        # Add assistant message to chat history
-        _append_message_to_session(response_dct)
+        # Add assistant message to chat history; tool outputs are indexed for search only
+        _append_message_to_session(response_dct, tool_executions=response.get("tool_executions"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
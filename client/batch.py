@@ -0,0 +1,157 @@
+"""Run a set of questions against the dbt MCP server without the Streamlit UI.
+
+Questions are read from a JSONL file, one object per line with a "question" field
+(other fields, e.g. "id" or "expected", are copied to the output). They run with
+bounded concurrency over one shared MCP connection, and each result is written to
+the output JSONL as soon as it completes. Credentials come from the same environment
+variables as the app (DBT_TOKEN, DBT_PROD_ENV_ID, DBT_HOST, DBT_MCP_URL,
+DBT_ENVIRONMENTS, OPENAI_API_KEY). Example (from the client directory):
+
+    python batch.py questions.jsonl -o answers.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, TextIO
+
+from services.http_transport import close_shared_transport
+from services.mcp_service import RemoteMCPClient, run_agent, setup_mcp_client
+from utils.async_helpers import suppress_async_warnings
+
+
+def read_questions(path: str) -> List[Dict]:
+    """Questions from a JSONL file; a line may also be a bare JSON string."""
+    questions = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            if not isinstance(item, dict) or not item.get("question"):
+                raise ValueError(f"{path}:{line_number}: expected an object with a \"question\" field")
+            questions.append(item)
+    return questions
+
+
+def _output_executions(tool_executions: List[Dict]) -> List[Dict]:
+    # The full-resolution CSV of downsampled series is for the UI download only
+    return [
+        {**ex, "series": {k: v for k, v in ex["series"].items() if k != "full_csv"}} if ex.get("series") else ex
+        for ex in tool_executions
+    ]
+
+
+async def run_question(client: RemoteMCPClient, index: int, item: Dict, api_key: str,
+                       use_cache: bool, timeout: Optional[float]) -> Dict:
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    started = time.perf_counter()
+    try:
+        # Every question is standalone: no chat history, and fresh answers unless --use-cache
+        # (query results are fresh too unless the client was connected with --use-query-store)
+        response = await asyncio.wait_for(
+            run_agent(client, item["question"], api_key, use_cache=use_cache, history=[]),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        response = {"output": "", "tool_executions": [], "error": f"Timed out after {timeout}s"}
+    return {
+        **item,
+        "index": index,
+        "output": response.get("output", ""),
+        "tool_executions": _output_executions(response.get("tool_executions", [])),
+        "error": response.get("error"),
+        "cached": bool(response.get("cached")),
+        "started_at": started_at,
+        "latency_s": round(time.perf_counter() - started, 3),
+    }
+
+
+async def run_batch(client: RemoteMCPClient, questions: List[Dict], out: TextIO,
+                    concurrency: int = 8, api_key: str = "", use_cache: bool = False,
+                    timeout: Optional[float] = None, progress: bool = True) -> List[Dict]:
+    """Answer every question, writing each result line to ``out`` as it completes."""
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Dict] = []
+
+    async def worker(index: int, item: Dict) -> None:
+        async with semaphore:
+            result = await run_question(client, index, item, api_key, use_cache, timeout)
+        out.write(json.dumps(result, default=str) + "\n")
+        out.flush()
+        results.append(result)
+        if progress:
+            status = "error" if result["error"] else "ok"
+            print(f"[{len(results)}/{len(questions)}] #{index} {status} {result['latency_s']}s",
+                  file=sys.stderr)
+
+    await asyncio.gather(*(worker(i, item) for i, item in enumerate(questions)))
+    return results
+
+
+def summarize(results: List[Dict], elapsed: float) -> Dict:
+    latencies = sorted(r["latency_s"] for r in results)
+    summary = {
+        "questions": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_min": round(len(results) / elapsed * 60, 1) if elapsed else 0.0,
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        summary.update(p50_s=round(cuts[49], 3), p95_s=round(cuts[94], 3), max_s=latencies[-1])
+    return summary
+
+
+async def main_async(args) -> Dict:
+    questions = read_questions(args.questions)
+    if args.url:
+        client = await RemoteMCPClient(
+            url=args.url, headers={}, model=args.model, use_query_store=args.use_query_store,
+        ).connect()
+    else:
+        client = await setup_mcp_client(model=args.model, use_query_store=args.use_query_store)
+
+    started = time.perf_counter()
+    try:
+        with open(args.output, "w") as out:
+            results = await run_batch(
+                client, questions, out, concurrency=args.concurrency,
+                api_key=os.getenv("OPENAI_API_KEY", ""), use_cache=args.use_cache,
+                timeout=args.timeout, progress=not args.quiet,
+            )
+    finally:
+        await client.close()
+        await close_shared_transport()
+    return summarize(results, time.perf_counter() - started)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="JSONL file of questions")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file for the results")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight at once")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds allowed per question")
+    parser.add_argument("--model", default=None, help="Model for the agent (default: agents SDK default)")
+    parser.add_argument("--use-cache", action="store_true", help="Allow answers from the answer cache")
+    parser.add_argument("--use-query-store", action="store_true",
+                        help="Allow query results from the materialized query store and count the queries")
+    parser.add_argument("--url", default=None, help="MCP server URL to use instead of the DBT_* settings")
+    parser.add_argument("--quiet", action="store_true", help="No per-question progress on stderr")
+    args = parser.parse_args(argv)
+
+    with suppress_async_warnings():
+        summary = asyncio.run(main_async(args))
+    print(json.dumps(summary), file=sys.stderr)
+    # Non-zero exit so scheduled runs notice failed questions
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Local stand-in for the remote dbt MCP server, for load and soak testing.
+
+Implements the Semantic Layer tools the app uses (list_metrics, get_dimensions,
+get_entities, query_metrics) over streamable HTTP, with configurable latency and
+payload sizes. Run it with:
+
+    python -m loadtest.fake_mcp_server --port 8765 --latency-ms 150 --rows 2000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import random
+from typing import Dict, List, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+
+def build_server(port: int, latency_ms: float = 100.0, jitter_ms: float = 50.0,
+                 rows: int = 1000, metrics: int = 20, json_response: bool = True) -> FastMCP:
+    mcp = FastMCP("fake-dbt", host="127.0.0.1", port=port, json_response=json_response)
+    metric_names = [f"metric_{i}" for i in range(metrics)]
+    start_day = datetime.date(2020, 1, 1)
+
+    async def simulate_latency():
+        await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+    @mcp.tool()
+    async def list_metrics() -> str:
+        """List all metrics in the dbt Semantic Layer."""
+        await simulate_latency()
+        return json.dumps([
+            {"name": name, "type": "SIMPLE", "label": name.replace("_", " ").title(),
+             "description": f"Synthetic metric {name}"}
+            for name in metric_names
+        ])
+
+    @mcp.tool()
+    async def get_dimensions(metrics: List[str]) -> str:
+        """Get the dimensions available for the given metrics."""
+        await simulate_latency()
+        return json.dumps([
+            {"name": "metric_time", "type": "TIME", "queryable_granularities": ["DAY", "WEEK", "MONTH"]},
+            {"name": "customer__region", "type": "CATEGORICAL"},
+            {"name": "order__channel", "type": "CATEGORICAL"},
+        ])
+
+    @mcp.tool()
+    async def get_entities(metrics: List[str]) -> str:
+        """Get the entities available for the given metrics."""
+        await simulate_latency()
+        return json.dumps([{"name": "customer", "type": "FOREIGN"}, {"name": "order", "type": "PRIMARY"}])
+
+    @mcp.tool()
+    async def query_metrics(metrics: List[str], group_by: Optional[List[Dict]] = None,
+                            order_by: Optional[List[Dict]] = None, where: Optional[str] = None,
+                            limit: Optional[int] = None) -> str:
+        """Query metrics, optionally grouped by dimensions."""
+        await simulate_latency()
+        count = min(rows, limit) if limit else rows
+        return json.dumps([
+            {"METRIC_TIME__DAY": (start_day + datetime.timedelta(days=i)).isoformat(),
+             **{name.upper(): round(1000 + 100 * random.random() + i, 2) for name in metrics}}
+            for i in range(count)
+        ])
+
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Mean latency per tool call")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform jitter around the mean latency")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows returned by query_metrics")
+    parser.add_argument("--metrics", type=int, default=20, help="Metrics returned by list_metrics")
+    parser.add_argument("--sse", action="store_true", help="Stream responses as SSE instead of plain JSON")
+    args = parser.parse_args()
+
+    server = build_server(args.port, args.latency_ms, args.jitter_ms, args.rows, args.metrics,
+                          json_response=not args.sse)
+    server.run(transport="streamable-http")
+
+
+if __name__ == "__main__":
+    main()
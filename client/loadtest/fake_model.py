@@ -0,0 +1,101 @@
+"""Scripted stand-in for the OpenAI model, so load tests cost nothing and are repeatable."""
+import asyncio
+import json
+import time
+import uuid
+from typing import List, Optional
+
+from agents import Model, ModelResponse, Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+)
+
+# Tool calls made on every turn, in order, before the final answer
+DEFAULT_SCRIPT = [
+    ("list_metrics", {}),
+    ("get_dimensions", {"metrics": ["metric_0"]}),
+    ("query_metrics", {
+        "metrics": ["metric_0"],
+        "group_by": [{"name": "metric_time", "grain": "DAY", "type": "time_dimension"}],
+    }),
+]
+
+
+class ScriptedModel(Model):
+    """Replays a fixed sequence of tool calls, then answers with a short summary.
+
+    Tool names are matched by suffix so the script also works with namespaced
+    multi-environment tools (``prod__list_metrics``).
+    """
+
+    def __init__(self, script: Optional[List] = None, latency_ms: float = 0.0):
+        self.script = script or DEFAULT_SCRIPT
+        self.latency_ms = latency_ms
+
+    async def get_response(self, system_instructions, input, model_settings, tools,
+                           output_schema, handoffs, tracing, *, previous_response_id=None,
+                           conversation_id=None, prompt=None) -> ModelResponse:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        items = input if isinstance(input, list) else [{"role": "user", "content": input}]
+        # Tool results produced since the latest user message tell us where we are in the script
+        last_user = max((i for i, item in enumerate(items) if item.get("role") == "user"), default=-1)
+        outputs = [item for item in items[last_user + 1:] if item.get("type") == "function_call_output"]
+        step = len(outputs)
+
+        if step < len(self.script):
+            tool_name, arguments = self.script[step]
+            name = next(
+                (t.name for t in tools if t.name == tool_name or t.name.endswith(f"__{tool_name}")),
+                tool_name,
+            )
+            output = ResponseFunctionToolCall(
+                id=f"fc_{uuid.uuid4().hex}",
+                call_id=f"call_{uuid.uuid4().hex}",
+                name=name,
+                arguments=json.dumps(arguments),
+                type="function_call",
+                status="completed",
+            )
+        else:
+            last_output = str(outputs[-1].get("output", "")) if outputs else ""
+            output = ResponseOutputMessage(
+                id=f"msg_{uuid.uuid4().hex}",
+                role="assistant",
+                status="completed",
+                type="message",
+                content=[ResponseOutputText(
+                    type="output_text",
+                    annotations=[],
+                    text=f"Scripted answer after {step} tool calls ({len(last_output)} chars of data).",
+                )],
+            )
+        return ModelResponse(output=[output], usage=Usage(requests=1), response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools,
+                              output_schema, handoffs, tracing, *, previous_response_id=None,
+                              conversation_id=None, prompt=None):
+        # The whole scripted turn arrives as a single completed event
+        response = await self.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+        )
+        yield ResponseCompletedEvent(
+            type="response.completed",
+            sequence_number=0,
+            response=Response(
+                id=f"resp_{uuid.uuid4().hex}",
+                created_at=time.time(),
+                model="scripted",
+                object="response",
+                output=response.output,
+                tool_choice="auto",
+                tools=[],
+                parallel_tool_calls=False,
+            ),
+        )
@@ -0,0 +1,303 @@
+"""Multi-user load and soak test for run_agent against a local stand-in dbt MCP server.
+
+Every simulated session runs in its own thread with its own event loop and MCP
+connection, the way Streamlit sessions do, and asks a series of questions through
+run_agent with a scripted model. Examples (from the client directory):
+
+    python -m loadtest.run_load --sessions 100 --turns 5
+    python -m loadtest.run_load --sessions 50 --duration 3600 --json-out soak.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from agents import set_tracing_disabled
+
+from loadtest.fake_model import ScriptedModel
+from services.http_transport import close_shared_transport
+from services.mcp_service import RemoteMCPClient, run_agent
+from utils.async_helpers import suppress_async_warnings
+from utils.instrumentation import get_counters
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What was revenue by month last quarter?",
+    "Show me daily orders for the last two years",
+    "Which regions had the highest churn?",
+    "Compare average order value by channel",
+    "How many active customers did we have each week?",
+]
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak RSS (KB on Linux, bytes on macOS)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadResults:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.errors: List[str] = []
+        self.failed_sessions: List[str] = []
+        self.memory_samples: List[tuple] = []
+
+    def record_turn(self, seconds: float, error: Optional[str]) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+            if error:
+                self.errors.append(error)
+
+    def record_session_failure(self, error: str) -> None:
+        with self._lock:
+            self.failed_sessions.append(error)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _port_in_use(port: int) -> bool:
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def _wait_for_server(server: subprocess.Popen, port: int, log, timeout: float = 30.0) -> None:
+    """Wait until the fake server listens on ``port``; raise with its output if it exits first."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            log.seek(0)
+            output = log.read().decode(errors="replace").strip()
+            raise RuntimeError(f"Fake MCP server exited with code {server.returncode}:\n{output[-2000:]}")
+        if _port_in_use(port):
+            return
+        time.sleep(0.2)
+    server.terminate()
+    raise TimeoutError(f"Fake MCP server did not start on port {port}")
+
+
+def _run_session(index: int, args, url: str, deadline: Optional[float],
+                 results: LoadResults, stop: threading.Event) -> None:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    client = None
+    history: List[Dict] = []
+    try:
+        client = loop.run_until_complete(RemoteMCPClient(
+            url=url, headers={}, model=ScriptedModel(latency_ms=args.model_latency_ms),
+            use_query_store=args.use_query_store,
+        ).connect())
+
+        turn = 0
+        while not stop.is_set():
+            if deadline is None and turn >= args.turns:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+            question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+            started = time.perf_counter()
+            response = loop.run_until_complete(
+                run_agent(client, question, "", use_cache=args.use_cache, history=history)
+            )
+            results.record_turn(time.perf_counter() - started, response.get("error"))
+
+            # Keep history the way the app does, so memory growth is representative
+            history.append({"role": "user", "content": question})
+            history.append({"role": "assistant", "content": response.get("output", "")})
+            if args.max_history:
+                del history[:-args.max_history]
+
+            turn += 1
+            if args.think_ms:
+                time.sleep(random.uniform(0, 2 * args.think_ms) / 1000)
+    except Exception as e:
+        results.record_session_failure(f"session {index}: {e}")
+    finally:
+        with suppress_async_warnings():
+            try:
+                if client is not None:
+                    loop.run_until_complete(client.close())
+                loop.run_until_complete(close_shared_transport())
+            except Exception:
+                pass
+            loop.close()
+
+
+def _sample_memory(results: LoadResults, started: float, interval: float, stop: threading.Event) -> None:
+    while True:
+        results.memory_samples.append((time.monotonic() - started, _rss_mb()))
+        if stop.wait(interval):
+            results.memory_samples.append((time.monotonic() - started, _rss_mb()))
+            return
+
+
+def build_report(args, results: LoadResults, elapsed: float) -> Dict:
+    latencies = sorted(results.latencies)
+    samples = results.memory_samples
+    report = {
+        "sessions": args.sessions,
+        "turns": len(latencies),
+        "turn_errors": len(results.errors),
+        "failed_sessions": len(results.failed_sessions),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_s": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+            "mean": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        },
+        "memory_mb": {
+            "start": round(samples[0][1], 1) if samples else None,
+            "end": round(samples[-1][1], 1) if samples else None,
+            "peak": round(max(s[1] for s in samples), 1) if samples else None,
+        },
+        "transport": get_counters("mcp_http."),
+        "hedging": get_counters("mcp_hedge."),
+        "query_store": get_counters("query_store."),
+        "error_samples": (results.errors + results.failed_sessions)[:5],
+    }
+    if samples:
+        report["memory_mb"]["growth"] = round(samples[-1][1] - samples[0][1], 1)
+    if len(samples) >= 3 and elapsed >= 60:
+        # Least-squares slope over the run, so soak tests show steady creep rather than warmup
+        xs, ys = [s[0] for s in samples], [s[1] for s in samples]
+        slope = statistics.linear_regression(xs, ys).slope
+        report["memory_mb"]["growth_per_hour"] = round(slope * 3600, 1)
+    return report
+
+
+def print_report(report: Dict) -> None:
+    lat, mem = report["latency_s"], report["memory_mb"]
+    print(f"\nSessions: {report['sessions']}  turns: {report['turns']}  "
+          f"turn errors: {report['turn_errors']}  failed sessions: {report['failed_sessions']}")
+    print(f"Elapsed: {report['elapsed_s']}s  throughput: {report['throughput_turns_per_s']} turns/s")
+    print(f"Turn latency: p50 {lat['p50']}s  p95 {lat['p95']}s  p99 {lat['p99']}s  max {lat['max']}s")
+    print(f"Memory: start {mem['start']} MB  end {mem['end']} MB  peak {mem['peak']} MB  "
+          f"growth {mem.get('growth')} MB ({mem.get('growth_per_hour', 'n/a')} MB/h)")
+    if report["transport"]:
+        print("Transport: " + ", ".join(f"{k.split('.', 1)[1]}={v}" for k, v in report["transport"].items()))
+    if report["hedging"]:
+        print("Hedging: " + ", ".join(f"{k.split('.', 1)[1]}={v}" for k, v in report["hedging"].items()))
+    if report["query_store"]:
+        print("Query store: " + ", ".join(f"{k.split('.', 1)[1]}={v}" for k, v in report["query_store"].items()))
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="Questions per session (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="Soak for this many seconds instead")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which sessions start")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="Mean pause between a user's questions")
+    parser.add_argument("--max-history", type=int, default=0, help="Messages kept per session (0 = all, like the app)")
+    parser.add_argument("--model-latency-ms", type=float, default=200.0, help="Latency of each scripted model step")
+    parser.add_argument("--use-cache", action="store_true", help="Allow answers from the answer cache")
+    parser.add_argument("--use-query-store", action="store_true",
+                        help="Record queries and answer them from the materialized query store")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="Seconds between memory samples")
+    parser.add_argument("--url", default=None, help="Use an already running MCP server instead of starting one")
+    parser.add_argument("--port", type=int, default=0, help="Port for the fake MCP server (0 = any free port)")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Fake server latency per tool call")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Fake server latency jitter")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows returned by query_metrics")
+    parser.add_argument("--json-out", default=None, help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    set_tracing_disabled(True)
+    server = None
+    url = args.url
+    if url is None:
+        port = args.port or _free_port()
+        # Otherwise the run would silently benchmark whatever already listens there
+        if _port_in_use(port):
+            parser.error(f"port {port} is already in use; pass another --port, or --url to use that server")
+        # The server's output goes to a file: a pipe nobody reads would block it
+        server_log = tempfile.TemporaryFile()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "loadtest.fake_mcp_server", "--port", str(port),
+             "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+             "--rows", str(args.rows)],
+            cwd=CLIENT_DIR, stdout=server_log, stderr=subprocess.STDOUT,
+        )
+        _wait_for_server(server, port, server_log)
+        url = f"http://127.0.0.1:{port}/mcp"
+
+    results = LoadResults()
+    stop = threading.Event()
+    started = time.monotonic()
+    deadline = started + args.duration if args.duration else None
+    sampler_stop = threading.Event()
+    sampler = threading.Thread(
+        target=_sample_memory, args=(results, started, args.sample_interval, sampler_stop), daemon=True,
+    )
+    sampler.start()
+
+    threads = []
+    try:
+        for index in range(args.sessions):
+            thread = threading.Thread(
+                target=_run_session, args=(index, args, url, deadline, results, stop),
+                name=f"session-{index}", daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+            if args.ramp_up and args.sessions > 1:
+                time.sleep(args.ramp_up / args.sessions)
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        elapsed = time.monotonic() - started
+        sampler_stop.set()
+        sampler.join()
+        if server is not None:
+            server.terminate()
+            server.wait()
+            server_log.close()
+
+    report = build_report(args, results, elapsed)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
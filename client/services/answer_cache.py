@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Freshness and similarity are tunable without code changes
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+# A session re-checks its catalog version before using the cache once this much time has passed
+ANSWER_CACHE_CATALOG_CHECK_SECONDS = float(os.getenv("ANSWER_CACHE_CATALOG_CHECK_SECONDS", "300"))
+
+# Filler words that don't change what is being asked
+_FILLER_WORDS = {
+    "a", "an", "the", "please", "can", "could", "would", "you", "me", "show",
+    "tell", "give", "what", "whats", "is", "are", "was", "were", "i", "want",
+    "to", "see", "get", "list", "my", "our",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, strip punctuation and filler words so phrasing variants share a key."""
+    tokens = _TOKEN_RE.findall((question or "").lower())
+    return " ".join(t for t in tokens if t not in _FILLER_WORDS)
+
+
+def _stem(token: str) -> str:
+    # Plural and singular forms ask the same thing ("refund"/"refunds")
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def _similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the normalized questions' words.
+
+    Words are compared whole, so a single substituted word ("including" for
+    "excluding", "ascending" for "descending") scores well below the threshold.
+    """
+    # Numbers (years, limits, top-N) must match exactly; a near-duplicate with
+    # a different number is a different question.
+    if _NUMBER_RE.findall(a) != _NUMBER_RE.findall(b):
+        return 0.0
+    words_a = {_stem(t) for t in a.split()}
+    words_b = {_stem(t) for t in b.split()}
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def _without_full_data(execution: Dict) -> Dict:
+    # Downsampled series carry the full-resolution CSV, often megabytes; cached
+    # answers keep the chart only
+    series = execution.get("series")
+    if not series or "full_csv" not in series:
+        return execution
+    return {**execution, "series": {k: v for k, v in series.items() if k != "full_csv"}}
+
+
+class AnswerCache:
+    """Final-answer cache shared by all sessions of this process.
+
+    Entries are grouped per environment and semantic catalog version, so a
+    catalog change makes every older answer for that environment unreachable.
+    """
+
+    def __init__(self, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 similarity: float = ANSWER_CACHE_SIMILARITY,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (environment, catalog_version) -> normalized question -> entry
+        self._scopes: Dict[Tuple[str, str], "OrderedDict[str, Dict]"] = {}
+
+    def note_catalog(self, environment: str, catalog_version: str) -> None:
+        """Drop answers computed against any other catalog version of this environment."""
+        with self._lock:
+            for scope in list(self._scopes):
+                if scope[0] == environment and scope[1] != catalog_version:
+                    del self._scopes[scope]
+
+    def lookup(self, environment: str, catalog_version: str, question: str,
+               available_tools: List[str]) -> Optional[Dict]:
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entries = self._scopes.get((environment, catalog_version))
+            if not entries:
+                return None
+
+            # Evict expired answers before matching
+            for key in [k for k, e in entries.items() if now - e["cached_at"] > self.ttl_seconds]:
+                del entries[key]
+
+            entry = entries.get(normalized)
+            if entry is None:
+                best_score = 0.0
+                for key, candidate in entries.items():
+                    score = _similarity(normalized, key)
+                    if score >= self.similarity and score > best_score:
+                        best_score, entry = score, candidate
+
+            if entry is None:
+                return None
+            # The answer is only reusable if every tool it relied on is still offered
+            if not set(entry["tools_used"]).issubset(available_tools):
+                return None
+
+            entries.move_to_end(entry["normalized"])
+            return dict(entry)
+
+    def store(self, environment: str, catalog_version: str, question: str,
+              response: Dict) -> None:
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+
+        tools_used = sorted({
+            ex.get("tool_name", "unknown") for ex in response.get("tool_executions", [])
+        })
+        entry = {
+            "normalized": normalized,
+            "question": question,
+            "output": response.get("output", ""),
+            "tool_executions": [_without_full_data(ex) for ex in response.get("tool_executions", [])],
+            "tools_used": tools_used,
+            "cached_at": time.time(),
+        }
+        with self._lock:
+            entries = self._scopes.setdefault((environment, catalog_version), OrderedDict())
+            entries[normalized] = entry
+            entries.move_to_end(normalized)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def discard(self, environment: str, catalog_version: str, question: str) -> None:
+        """Forget the answer to a question, e.g. when the user asks for a refresh."""
+        normalized = normalize_question(question)
+        with self._lock:
+            entries = self._scopes.get((environment, catalog_version))
+            if entries:
+                entries.pop(normalized, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+
+
+answer_cache = AnswerCache()
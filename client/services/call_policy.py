@@ -0,0 +1,181 @@
+import os
+import json
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import anyio
+import httpx
+from mcp.shared.exceptions import McpError
+
+from utils.instrumentation import increment
+
+# Hedging: a second request is sent once the first is slower than this latency percentile
+MCP_HEDGE_PERCENTILE = float(os.getenv("MCP_HEDGE_PERCENTILE", "95"))
+# Delay used until enough latencies have been observed for a tool
+MCP_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("MCP_HEDGE_DEFAULT_DELAY_MS", "1000"))
+MCP_HEDGE_MIN_DELAY_MS = float(os.getenv("MCP_HEDGE_MIN_DELAY_MS", "50"))
+MCP_HEDGE_MIN_SAMPLES = int(os.getenv("MCP_HEDGE_MIN_SAMPLES", "20"))
+# Extra load cap: each call earns this fraction of a hedge or retry, banked up to MCP_HEDGE_BURST
+MCP_HEDGE_BUDGET = float(os.getenv("MCP_HEDGE_BUDGET", "0.1"))
+MCP_HEDGE_BURST = float(os.getenv("MCP_HEDGE_BURST", "10"))
+MCP_RETRY_BACKOFF_MS = float(os.getenv("MCP_RETRY_BACKOFF_MS", "200"))
+
+# Metadata tools are cheap and idempotent, so they are hedged; query_metrics is idempotent
+# too but runs warehouse queries, so it is only retried when the request never reached the
+# server, not after a timeout. Tools not listed get neither.
+DEFAULT_POLICIES: Dict[str, Dict[str, Any]] = {
+    "list_metrics": {"idempotent": True, "hedge": True, "max_retries": 2},
+    "get_dimensions": {"idempotent": True, "hedge": True, "max_retries": 2},
+    "get_entities": {"idempotent": True, "hedge": True, "max_retries": 2},
+    "query_metrics": {"idempotent": True, "hedge": False, "max_retries": 1, "retry_timeouts": False},
+}
+
+# Failures where the request never reached the server
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ConnectionRefusedError)
+_NOT_SENT_STATUS = {429, 502, 503}
+# Failures after the request may have reached the server: timeouts and broken connections
+_MAYBE_SENT_ERRORS = (
+    httpx.TransportError, TimeoutError, ConnectionError, anyio.ClosedResourceError, anyio.BrokenResourceError,
+)
+
+
+def is_retryable(error: BaseException, retry_timeouts: bool = True) -> bool:
+    """Whether ``error`` is a transient transport failure worth retrying.
+
+    Errors the server answered with, e.g. invalid params, are never retried. Timeouts
+    and dropped connections are retried only with ``retry_timeouts``, since the server
+    may still be working on the first request.
+    """
+    group = getattr(error, "exceptions", None)
+    if group:
+        return all(is_retryable(e, retry_timeouts) for e in group)
+    if isinstance(error, _NOT_SENT_ERRORS):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in _NOT_SENT_STATUS or (retry_timeouts and status >= 500)
+    if isinstance(error, McpError):
+        # The MCP session reports a request that got no response in time as HTTP 408
+        return retry_timeouts and error.error.code == httpx.codes.REQUEST_TIMEOUT
+    if isinstance(error, _MAYBE_SENT_ERRORS):
+        return retry_timeouts
+    return False
+
+
+def load_policies() -> Dict[str, Dict[str, Any]]:
+    """Default policies, overridden per tool by the MCP_CALL_POLICIES JSON object."""
+    policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+    overrides = json.loads(os.getenv("MCP_CALL_POLICIES", "") or "{}")
+    for name, policy in overrides.items():
+        policies.setdefault(name, {}).update(policy)
+    return policies
+
+
+class HedgingCaller:
+    """Retry and hedging policy for MCP tool calls, shared by all sessions of the process.
+
+    Latency percentiles are tracked per server and tool from completed attempts. Hedges
+    and retries draw from one token bucket that every idempotent call tops up, so extra
+    load stays capped during an outage. Stats are recorded in the instrumentation
+    counters under ``mcp_hedge.``.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Dict[str, Any]]] = None, window: int = 200):
+        self.policies = policies if policies is not None else load_policies()
+        self._latencies: Dict[tuple, Deque[float]] = {}
+        self._window = window
+        self._tokens = MCP_HEDGE_BURST
+        self._lock = threading.Lock()
+
+    def _record_latency(self, key: tuple, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self._window)).append(seconds)
+
+    def hedge_delay(self, key: tuple) -> float:
+        """Seconds to wait for the first attempt before sending a hedge."""
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < MCP_HEDGE_MIN_SAMPLES:
+            return MCP_HEDGE_DEFAULT_DELAY_MS / 1000
+        index = min(len(samples) - 1, int(len(samples) * MCP_HEDGE_PERCENTILE / 100))
+        return max(samples[index], MCP_HEDGE_MIN_DELAY_MS / 1000)
+
+    def _earn_budget(self) -> None:
+        with self._lock:
+            self._tokens = min(MCP_HEDGE_BURST, self._tokens + MCP_HEDGE_BUDGET)
+
+    def _spend_budget(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    async def call(self, key: tuple, tool_name: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``attempt`` under the tool's policy; ``key`` identifies the server and tool."""
+        policy = self.policies.get(tool_name, {})
+        if not policy.get("idempotent"):
+            return await attempt()
+
+        self._earn_budget()
+        max_retries = int(policy.get("max_retries", 0))
+        for retry in range(max_retries + 1):
+            try:
+                if policy.get("hedge"):
+                    return await self._hedged(key, tool_name, attempt)
+                return await self._timed(key, attempt)
+            except Exception as e:
+                if retry == max_retries or not is_retryable(e, policy.get("retry_timeouts", True)):
+                    raise
+                if not self._spend_budget():
+                    increment("mcp_hedge.retries_skipped_budget")
+                    raise
+                increment("mcp_hedge.retries")
+                await asyncio.sleep(MCP_RETRY_BACKOFF_MS / 1000 * 2 ** retry)
+
+    async def _timed(self, key: tuple, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await attempt()
+        self._record_latency(key, loop.time() - started)
+        return result
+
+    async def _hedged(self, key: tuple, tool_name: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        increment("mcp_hedge.calls")
+        started = asyncio.get_running_loop().time()
+        primary = asyncio.ensure_future(self._timed(key, attempt))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(key))
+            if done or not self._spend_budget():
+                if not done:
+                    increment("mcp_hedge.skipped_budget")
+                return await primary
+
+            hedge = asyncio.ensure_future(self._timed(key, attempt))
+            tasks.add(hedge)
+            increment("mcp_hedge.issued")
+
+            # First successful attempt wins; fail only when both attempts failed
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if not t.cancelled() and t.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        # The abandoned first attempt took at least this long; keeping it
+                        # stops the percentile from forgetting the slow tail
+                        self._record_latency(key, asyncio.get_running_loop().time() - started)
+                        increment("mcp_hedge.won")
+                        increment(f"mcp_hedge.won.{tool_name}")
+                    return winner.result()
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+hedging_caller = HedgingCaller()
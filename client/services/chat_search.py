@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import hashlib
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional
+
+# Every chat message and tool output is indexed here for the sidebar search
+CHAT_SEARCH_ENABLED = os.getenv("CHAT_SEARCH_ENABLED", "1").lower() in ("1", "true", "yes")
+CHAT_SEARCH_DB_PATH = os.getenv("CHAT_SEARCH_DB_PATH", ".chat_history.db")
+CHAT_SEARCH_MAX_HITS = int(os.getenv("CHAT_SEARCH_MAX_HITS", "10"))
+# Stored chats untouched for this long are deleted; 0 keeps them forever
+CHAT_SEARCH_RETENTION_DAYS = float(os.getenv("CHAT_SEARCH_RETENTION_DAYS", "90"))
+# Chats of anonymous browser sessions can't be reopened after a reload, so they go sooner
+CHAT_SEARCH_SESSION_RETENTION_HOURS = float(os.getenv("CHAT_SEARCH_SESSION_RETENTION_HOURS", "24"))
+_PURGE_INTERVAL_SECONDS = 3600
+
+# Message keys not worth storing: charts carry the full-resolution CSV
+_UNSTORED_KEYS = {"charts"}
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS chats (
+        chat_id TEXT PRIMARY KEY, owner TEXT NOT NULL, chat_name TEXT, updated_at REAL)""",
+    "CREATE INDEX IF NOT EXISTS chats_owner ON chats (owner, updated_at)",
+    """CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY, chat_id TEXT NOT NULL, position INTEGER, message TEXT)""",
+    "CREATE INDEX IF NOT EXISTS messages_chat ON messages (chat_id, position)",
+    # The owner is indexed as a single token so MATCH only ever ranks the owner's rows
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+        body, owner_token, kind UNINDEXED, chat_id UNINDEXED, tokenize = 'porter unicode61')""",
+    # FTS5 can only look rows up by rowid, so each message's search rowids are kept here
+    """CREATE TABLE IF NOT EXISTS search_rows (
+        search_rowid INTEGER PRIMARY KEY, message_id INTEGER NOT NULL, chat_id TEXT NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS search_rows_message ON search_rows (message_id)",
+    "CREATE INDEX IF NOT EXISTS search_rows_chat ON search_rows (chat_id)",
+]
+
+
+def owner_token(owner: str) -> str:
+    return "o" + hashlib.sha256(owner.encode()).hexdigest()[:24]
+
+
+def fts_query(text: str) -> Optional[str]:
+    """FTS5 query matching all words of ``text``, the last one as a prefix (search as you type)."""
+    terms = [f'"{term}"' for term in _TERM_RE.findall(text or "")]
+    if not terms:
+        return None
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class ChatSearchIndex:
+    """SQLite FTS5 index of chat messages and tool outputs, scoped per owner.
+
+    Chats are stored with their messages so search hits can be reopened after the
+    session that created them is gone. Old chats are purged as new messages come in
+    (see ``purge_expired``). When SQLite lacks FTS5, ``available`` is False and
+    indexing is skipped.
+    """
+
+    def __init__(self, path: str = CHAT_SEARCH_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready: Optional[bool] = None
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    @property
+    def available(self) -> bool:
+        if not CHAT_SEARCH_ENABLED:
+            return False
+        with self._lock:
+            if self._ready is None:
+                try:
+                    with closing(self._connect()) as conn, conn:
+                        conn.execute("PRAGMA journal_mode = WAL")
+                        for statement in _SCHEMA:
+                            conn.execute(statement)
+                    self._ready = True
+                except sqlite3.OperationalError:
+                    # e.g. "no such module: fts5"
+                    self._ready = False
+            return self._ready
+
+    def index_message(self, owner: str, chat_id: str, chat_name: str, position: int,
+                      message: Dict, tool_executions: Optional[List[Dict]] = None,
+                      replace: bool = False) -> None:
+        """Store one chat message and index it, plus the tool outputs that produced it.
+
+        With ``replace``, the message stored at ``position`` and its index rows are replaced.
+        """
+        if not self.available:
+            return
+        stored = {k: v for k, v in message.items() if k not in _UNSTORED_KEYS}
+        token = owner_token(owner)
+        rows = [(message.get("content") or "", token, "message", chat_id)]
+        for execution in tool_executions or []:
+            body = " ".join([
+                str(execution.get("tool_name", "")),
+                json.dumps(execution.get("input", {}), default=str),
+                str(execution.get("output", "")),
+            ])
+            rows.append((body, token, "tool", chat_id))
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """INSERT INTO chats VALUES (?, ?, ?, ?)
+                   ON CONFLICT (chat_id) DO UPDATE
+                   SET chat_name = excluded.chat_name, updated_at = excluded.updated_at""",
+                (chat_id, owner, chat_name, time.time()),
+            )
+            if replace:
+                for (message_id,) in conn.execute(
+                    "SELECT id FROM messages WHERE chat_id = ? AND position = ?", (chat_id, position),
+                ).fetchall():
+                    self._delete_search_rows(conn, "message_id", message_id)
+                    conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            message_id = conn.execute(
+                "INSERT INTO messages (chat_id, position, message) VALUES (?, ?, ?)",
+                (chat_id, position, json.dumps(stored, default=str)),
+            ).lastrowid
+            for row in rows:
+                search_rowid = conn.execute(
+                    "INSERT INTO search (body, owner_token, kind, chat_id) VALUES (?, ?, ?, ?)", row,
+                ).lastrowid
+                conn.execute("INSERT INTO search_rows VALUES (?, ?, ?)", (search_rowid, message_id, chat_id))
+
+        if time.time() - self._last_purge >= _PURGE_INTERVAL_SECONDS:
+            self._last_purge = time.time()
+            self.purge_expired()
+
+    def search(self, owner: str, text: str, limit: int = CHAT_SEARCH_MAX_HITS) -> List[Dict]:
+        """Best matching chats of an owner, each with the snippet of its best hit."""
+        query = fts_query(text)
+        if query is None or not self.available:
+            return []
+        with closing(self._connect()) as conn:
+            try:
+                rows = conn.execute(
+                    """SELECT s.chat_id, c.chat_name, s.kind,
+                              snippet(search, 0, '**', '**', '…', 12), bm25(search, 1.0, 0.0) AS rank
+                       FROM search AS s JOIN chats AS c ON c.chat_id = s.chat_id
+                       WHERE search MATCH ?
+                       ORDER BY rank LIMIT ?""",
+                    (f'owner_token : "{owner_token(owner)}" AND body : ({query})', limit * 5),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+
+        # One hit per chat, keeping the best ranked snippet
+        hits: Dict[str, Dict] = {}
+        for chat_id, chat_name, kind, snippet, rank in rows:
+            if chat_id not in hits:
+                hits[chat_id] = {"chat_id": chat_id, "chat_name": chat_name, "kind": kind, "snippet": snippet}
+        return list(hits.values())[:limit]
+
+    def load_chat(self, owner: str, chat_id: str) -> Optional[Dict]:
+        """A stored chat in the session's history format, or None if the owner has no such chat."""
+        if not self.available:
+            return None
+        with closing(self._connect()) as conn:
+            chat = conn.execute(
+                "SELECT chat_name FROM chats WHERE chat_id = ? AND owner = ?", (chat_id, owner),
+            ).fetchone()
+            if chat is None:
+                return None
+            rows = conn.execute(
+                "SELECT message FROM messages WHERE chat_id = ? ORDER BY position, id", (chat_id,),
+            ).fetchall()
+        return {"chat_id": chat_id, "chat_name": chat[0], "messages": [json.loads(r[0]) for r in rows]}
+
+    def delete_chat(self, owner: str, chat_id: str) -> None:
+        if not self.available:
+            return
+        with closing(self._connect()) as conn, conn:
+            if conn.execute("DELETE FROM chats WHERE chat_id = ? AND owner = ?", (chat_id, owner)).rowcount:
+                self._delete_search_rows(conn, "chat_id", chat_id)
+                conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+
+    @staticmethod
+    def _delete_search_rows(conn: sqlite3.Connection, column: str, key) -> None:
+        """Delete the index rows of one message (``message_id``) or chat (``chat_id``)."""
+        search_rowids = conn.execute(
+            f"SELECT search_rowid FROM search_rows WHERE {column} = ?", (key,),
+        ).fetchall()
+        # Deleting from FTS5 by rowid is a lookup; by an UNINDEXED column it is a full scan
+        conn.executemany("DELETE FROM search WHERE rowid = ?", search_rowids)
+        conn.execute(f"DELETE FROM search_rows WHERE {column} = ?", (key,))
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete chats past their retention period. Returns how many were deleted."""
+        if not self.available:
+            return 0
+        now = time.time() if now is None else now
+        cutoffs = []
+        if CHAT_SEARCH_RETENTION_DAYS > 0:
+            cutoffs.append(("1", now - CHAT_SEARCH_RETENTION_DAYS * 86400))
+        if CHAT_SEARCH_SESSION_RETENTION_HOURS > 0:
+            cutoffs.append(("owner LIKE 'session:%'", now - CHAT_SEARCH_SESSION_RETENTION_HOURS * 3600))
+        if not cutoffs:
+            return 0
+        where = " OR ".join(f"({condition} AND updated_at < ?)" for condition, _ in cutoffs)
+        with closing(self._connect()) as conn, conn:
+            chat_ids = [row[0] for row in conn.execute(
+                f"SELECT chat_id FROM chats WHERE {where}", [cutoff for _, cutoff in cutoffs],
+            )]
+            for chat_id in chat_ids:
+                conn.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+                conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+                self._delete_search_rows(conn, "chat_id", chat_id)
+        return len(chat_ids)
+
+
+chat_search = ChatSearchIndex()
@@ -1,5 +1,7 @@
 import streamlit as st
 import uuid
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from services.chat_search import chat_search
 
 # Session state initialization
 def init_session():
@@ -13,7 +15,8 @@ def init_session():
         "agent": None,
         "tools": [],
         "tool_executions": [],
-        "servers": {"dbt": "Remote dbt MCP Server"}
+        # Connected environment name -> MCP URL, filled in on connect
+        "servers": {}
     }
     
     for key, val in defaults.items():
@@ -39,16 +42,58 @@ def get_current_chat(chat_id):
             return chat['messages']
     return []
 
-def _append_message_to_session(msg: dict) -> None:
-    """Append message to the current chat's message list and keep history_chats in-sync."""
+def get_owner_id():
+    """Owner of this session's chats for search: the signed-in user, else the browser session."""
+    user = getattr(st, "user", None)
+    if user is not None and user.get("is_logged_in") and user.get("email"):
+        return f"user:{user.get('email')}"
+    ctx = get_script_run_ctx()
+    return f"session:{ctx.session_id}" if ctx else "session:local"
+
+def _append_message_to_session(msg: dict, tool_executions=None) -> None:
+    """Append message to the current chat's message list and keep history_chats in-sync.
+
+    The message (and the tool outputs behind it) is also indexed for chat search.
+    """
     chat_id = st.session_state["current_chat_id"]
     st.session_state["messages"].append(msg)
+    chat_name = "New chat"
     for chat in st.session_state["history_chats"]:
         if chat["chat_id"] == chat_id:
             chat["messages"] = st.session_state["messages"]
             if chat["chat_name"] == "New chat":
                 chat["chat_name"] = " ".join(msg["content"].split()[:5]) or "Empty"
+            chat_name = chat["chat_name"]
             break
+    chat_search.index_message(
+        get_owner_id(), chat_id, chat_name, len(st.session_state["messages"]) - 1, msg, tool_executions
+    )
+
+def _replace_message_in_session(index: int, msg: dict, tool_executions=None) -> None:
+    """Replace a message of the current chat in place and re-index it for chat search."""
+    chat_id = st.session_state["current_chat_id"]
+    st.session_state["messages"][index] = msg
+    chat_name = next(
+        (c["chat_name"] for c in st.session_state["history_chats"] if c["chat_id"] == chat_id), "New chat"
+    )
+    chat_search.index_message(get_owner_id(), chat_id, chat_name, index, msg, tool_executions, replace=True)
+
+def open_chat(chat_id: str) -> None:
+    """Make a chat current, loading it from the search store if it is no longer in memory."""
+    chats = st.session_state["history_chats"]
+    position = next((i for i, c in enumerate(chats) if c["chat_id"] == chat_id), None)
+    if position is None:
+        chat = chat_search.load_chat(get_owner_id(), chat_id)
+        if chat is None:
+            return
+        chats.insert(0, chat)
+    elif position >= 50:
+        # The history list only shows the first 50 chats
+        chats.insert(0, chats.pop(position))
+    chat = next(c for c in chats if c["chat_id"] == chat_id)
+    st.session_state["current_chat_id"] = chat_id
+    st.session_state["messages"] = chat["messages"]
+    st.session_state["dbt_chat_history_radio"] = f"{chat['chat_name']}_::_{chat_id}"
 
 def create_chat():
     """Create a new chat session."""
@@ -67,6 +112,7 @@ def delete_chat(chat_id: str):
     if not chat_id:
         return
 
+    chat_search.delete_chat(get_owner_id(), chat_id)
     st.session_state["history_chats"] = [
         c for c in st.session_state["history_chats"]
         if c["chat_id"] != chat_id
@@ -0,0 +1,113 @@
+import os
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+from utils.instrumentation import increment
+
+# Transport tuning, shared by every MCP connection opened on the same event loop
+MCP_HTTP2 = os.getenv("MCP_HTTP2", "1").lower() in ("1", "true", "yes")
+MCP_MAX_CONNECTIONS = int(os.getenv("MCP_MAX_CONNECTIONS", "20"))
+MCP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MCP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+MCP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("MCP_KEEPALIVE_EXPIRY_SECONDS", "120"))
+
+# Same defaults as the MCP SDK: long read timeout because responses may be SSE streams
+MCP_DEFAULT_TIMEOUT = httpx.Timeout(30.0, read=300.0)
+
+# HTTP/2 and brotli decoding are optional extras of httpx
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """Non-owning view of a pooled transport that counts new vs reused connections.
+
+    The MCP SDK closes its HTTP client when a connection ends; closing this view
+    leaves the shared pool (and its warm TLS connections) open for the next one.
+    """
+
+    def __init__(self, pool: "_LoopPool"):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._pool.transport.handle_async_request(request)
+        self._pool.record(response)
+        return response
+
+    async def aclose(self) -> None:
+        pass
+
+
+class _LoopPool:
+    def __init__(self):
+        self.transport = httpx.AsyncHTTPTransport(
+            http2=MCP_HTTP2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=MCP_MAX_CONNECTIONS,
+                max_keepalive_connections=MCP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=MCP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        self._streams = weakref.WeakSet()
+
+    def record(self, response: httpx.Response) -> None:
+        increment("mcp_http.requests")
+        if response.extensions.get("http_version") == b"HTTP/2":
+            increment("mcp_http.http2_requests")
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        if stream in self._streams:
+            increment("mcp_http.connections_reused")
+        else:
+            self._streams.add(stream)
+            increment("mcp_http.connections_opened")
+
+
+# Connection pools are bound to the event loop they were created on, and every
+# Streamlit session runs its own loop, so there is one shared pool per loop.
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPool]" = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+
+def _pool_for_running_loop() -> _LoopPool:
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        pool = _pools.get(loop)
+        if pool is None:
+            pool = _pools[loop] = _LoopPool()
+        return pool
+
+
+def create_http_client(headers: Optional[Dict[str, str]] = None,
+                       timeout: Optional[httpx.Timeout] = None,
+                       auth: Optional[httpx.Auth] = None) -> httpx.AsyncClient:
+    """``httpx_client_factory`` for MCP servers that reuses the loop's shared transport."""
+    return httpx.AsyncClient(
+        headers={"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})},
+        timeout=timeout if timeout is not None else MCP_DEFAULT_TIMEOUT,
+        auth=auth,
+        follow_redirects=True,
+        transport=_SharedTransport(_pool_for_running_loop()),
+    )
+
+
+async def close_shared_transport() -> None:
+    """Close the running loop's pool; call before closing the loop itself."""
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        pool = _pools.pop(loop, None)
+    if pool is not None:
+        await pool.transport.aclose()
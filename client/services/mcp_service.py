@@ -1,23 +1,54 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 import os
+import re
 import json
+import asyncio
+import time
+import hashlib
+import functools
 import streamlit as st
 
-from agents import Agent, Runner
+from agents import Agent, FunctionTool, Model, ModelSettings, Runner
+from agents.exceptions import AgentsException, ModelBehaviorError
 from agents.mcp import create_static_tool_filter
 from agents.mcp.server import MCPServerStreamableHttp
 
+from services.answer_cache import ANSWER_CACHE_CATALOG_CHECK_SECONDS, answer_cache
+from services.call_policy import hedging_caller
+from services.http_transport import close_shared_transport, create_http_client
+from services.query_store import QUERY_STORE_DBT_TOKEN, query_store
+from services.tool_validation import ToolArgumentValidator
 from utils.async_helpers import run_async
+from utils.downsampling import reduce_tool_output
+from utils.instrumentation import increment
+from utils.worker_pool import process_text
+
+# Separator between environment name and tool name when several servers are connected
+TOOL_NAMESPACE_SEPARATOR = "__"
+_ENVIRONMENT_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
 
 
 class RemoteMCPClient:
-    """Thin wrapper around a remote dbt MCP server using the agents SDK."""
+    """Thin wrapper around one or more remote dbt MCP servers using the agents SDK.
+
+    Each entry of ``environments`` maps a short environment name to the ``url`` and
+    ``headers`` of its MCP server. With more than one environment, tools are exposed
+    to the agent as ``<environment>__<tool>``.
+    """
     
-    def __init__(self, url: str, headers: Dict[str, str], timeout_seconds: int = 60,
-                 allowed_tool_names: Optional[List[str]] = None):
-        self.url = url
-        self.headers = headers
+    def __init__(self, url: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                 timeout_seconds: int = 60, allowed_tool_names: Optional[List[str]] = None,
+                 environments: Optional[Dict[str, Dict[str, Any]]] = None,
+                 model: Optional[Union[str, Model]] = None, use_query_store: bool = True):
+        if environments is None:
+            environments = {"dbt": {"url": url, "headers": headers or {}}}
+        self.environments = environments
         self.timeout_seconds = timeout_seconds
+        # Model name or instance for the agent; None uses the agents SDK default
+        self.model = model
+        # Record query_metrics calls for popularity and answer them from the local store;
+        # off for runs that must hit the warehouse, e.g. batch runs
+        self.use_query_store = use_query_store
         self.allowed_tool_names = allowed_tool_names or [
             "list_metrics",
             "get_dimensions",
@@ -25,63 +56,264 @@ class RemoteMCPClient:
             "query_metrics",
         ]
 
-        self.server: Optional[MCPServerStreamableHttp] = None
+        self.servers: Dict[str, MCPServerStreamableHttp] = {}
         self.agent: Optional[Agent] = None
+        self._holders: List[asyncio.Task] = []
+        self._stop_event: Optional[asyncio.Event] = None
 
         # Tools metadata populated dynamically via list_tools
         self._tools_metadata: List[Dict[str, str]] = []
+        self._function_tools: List[FunctionTool] = []
+        # Compiled input schemas and learned metric catalog for local argument checks
+        self.validator = ToolArgumentValidator()
+        # Fingerprint of the tool schemas and semantic catalog, set by fetch_tools
+        self.catalog_version: Optional[str] = None
+        self.catalog_checked_at = 0.0
+        # Fingerprint of each environment's metric catalog alone, for materialized queries
+        self.server_catalog_versions: Dict[str, str] = {}
 
-    async def connect(self) -> "RemoteMCPClient":
-        self.server = MCPServerStreamableHttp(
-            name="dbt",
-            params={
-                "url": self.url,
-                "headers": self.headers,
-            },
-            client_session_timeout_seconds=self.timeout_seconds,
-            cache_tools_list=True,
-#            tool_filter=create_static_tool_filter(allowed_tool_names=self.allowed_tool_names),
+    @property
+    def environment(self) -> str:
+        """Identity of the set of dbt environments this client talks to."""
+        return ";".join(
+            f"{name}={cfg['url']}|{cfg['headers'].get('x-dbt-prod-environment-id', '')}"
+            for name, cfg in sorted(self.environments.items())
         )
 
-        # Manually enter the async context so we can keep the connection open across requests
-        await self.server.__aenter__()
+    def source(self, server_name: str) -> str:
+        """Identity of one environment, shared by every client connected to it."""
+        cfg = self.environments[server_name]
+        return f"{cfg['url']}|{cfg['headers'].get('x-dbt-prod-environment-id', '')}"
 
+    def qualified_tool_name(self, server_name: str, tool_name: str) -> str:
+        if len(self.environments) > 1:
+            return f"{server_name}{TOOL_NAMESPACE_SEPARATOR}{tool_name}"
+        return tool_name
+
+    def _instructions(self) -> str:
+        instructions = "Use the tools to answer the user's questions"
+        if len(self.environments) > 1:
+            names = ", ".join(self.environments)
+            instructions += (
+                f". Tools are namespaced per dbt environment as <environment>{TOOL_NAMESPACE_SEPARATOR}<tool>"
+                f" (environments: {names}). When a question involves several environments, "
+                "call the tools for each environment in parallel in the same step."
+            )
+        return instructions
+
+    async def connect(self) -> "RemoteMCPClient":
+        self.servers = {
+            name: MCPServerStreamableHttp(
+                name=name,
+                params={
+                    "url": cfg["url"],
+                    "headers": cfg["headers"],
+                    # Reuse pooled HTTP/2 keepalive connections across reconnects
+                    "httpx_client_factory": create_http_client,
+                },
+                client_session_timeout_seconds=self.timeout_seconds,
+                cache_tools_list=True,
+#                tool_filter=create_static_tool_filter(allowed_tool_names=self.allowed_tool_names),
+            )
+            for name, cfg in self.environments.items()
+        }
+
+        # Each connection lives in its own task that enters and later exits the server's
+        # async context, so connections stay open across requests, open concurrently,
+        # and are torn down in the task that created them.
+        self._stop_event = asyncio.Event()
+        ready = {name: asyncio.get_running_loop().create_future() for name in self.servers}
+        self._holders = [
+            asyncio.create_task(self._hold_connection(server, ready[name]))
+            for name, server in self.servers.items()
+        ]
+        results = await asyncio.gather(*ready.values(), return_exceptions=True)
+        failures = [(name, r) for name, r in zip(ready, results) if isinstance(r, BaseException)]
+        if failures:
+            await self.close()
+            name, error = failures[0]
+            raise ConnectionError(f"Environment '{name}': {error}") from error
+
+        try:
+            await self.fetch_tools()
+        except BaseException:
+            # Don't leave the connection holders running in the session loop
+            await self.close()
+            raise
+        if self.use_query_store:
+            query_store.start_refresher(materialize_popular_queries)
         self.agent = Agent(
             name="Assistant",
-            instructions="Use the tools to answer the user's questions",
-            mcp_servers=[self.server],
+            instructions=self._instructions(),
+            tools=self._function_tools,
+            model=self.model,
+            model_settings=ModelSettings(parallel_tool_calls=True),
         )
         return self
 
+    async def _hold_connection(self, server: MCPServerStreamableHttp, ready: asyncio.Future) -> None:
+        try:
+            await server.__aenter__()
+        except BaseException as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+        try:
+            await self._stop_event.wait()
+        finally:
+            await server.__aexit__(None, None, None)
+
     async def close(self) -> None:
-        if self.server is not None:
-            await self.server.__aexit__(None, None, None)
-            self.server = None
+        if self._stop_event is not None:
+            self._stop_event.set()
+        holders, self._holders = self._holders, []
+        await asyncio.gather(*holders, return_exceptions=True)
+        self.servers = {}
         self.agent = None
 
     def get_tools(self) -> List[Dict[str, str]]:
         return self._tools_metadata
 
     async def fetch_tools(self) -> List[Dict[str, str]]:
-        if self.server is None:
+        if not self.servers:
             return []
-        tools = await self.server.list_tools()
-        self._tools_metadata = [
-            {
-                "name": getattr(t, "name", "unknown"),
-                "description": getattr(t, "description", ""),
-                "schema": getattr(t, "input_schema", None),  # capture if present
-            }
-            for t in tools
-        ]
+        names = list(self.servers)
+        listed = await asyncio.gather(*(self.servers[name].list_tools() for name in names))
+
+        self._tools_metadata = []
+        self._function_tools = []
+        self.validator = ToolArgumentValidator()
+        for server_name, tools in zip(names, listed):
+            for t in tools:
+                tool_name = getattr(t, "name", "unknown")
+                schema = getattr(t, "inputSchema", None) or {}
+                qualified_name = self.qualified_tool_name(server_name, tool_name)
+                self._tools_metadata.append({
+                    "name": qualified_name,
+                    "description": getattr(t, "description", ""),
+                    "schema": schema,
+                    "server": server_name,
+                    "tool": tool_name,
+                })
+                self.validator.compile(server_name, tool_name, schema)
+                self._function_tools.append(FunctionTool(
+                    name=qualified_name,
+                    description=getattr(t, "description", "") or "",
+                    # MCP doesn't require `properties`, but OpenAI does
+                    params_json_schema={"properties": {}, **schema},
+                    on_invoke_tool=functools.partial(self._invoke_tool, server_name, tool_name),
+                    strict_json_schema=False,
+                ))
+        await self.refresh_catalog_version()
         return self._tools_metadata
 
+    async def refresh_catalog_version(self) -> Optional[str]:
+        """Fingerprint the tool schemas and metric catalogs so cached answers can be invalidated."""
+        if not self.servers:
+            return None
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self._tools_metadata, sort_keys=True, default=str).encode())
+
+        with_catalog = sorted({
+            t["server"] for t in self._tools_metadata if t["tool"] == "list_metrics"
+        })
+        results = await asyncio.gather(
+            *(self.call_tool(name, "list_metrics", {}) for name in with_catalog),
+            return_exceptions=True,
+        )
+        self.catalog_checked_at = time.monotonic()
+        failed = [
+            name for name, result in zip(with_catalog, results)
+            if isinstance(result, BaseException) or getattr(result, "isError", False)
+        ]
+        if failed and self.catalog_version is not None:
+            # A failed re-check is not a catalog change; keep the known version
+            return self.catalog_version
+        for name, result in zip(with_catalog, results):
+            # Fall back to the tool schemas alone for environments that fail here
+            if name in failed:
+                continue
+            text = _result_to_text(result)
+            digest.update(name.encode())
+            digest.update(text.encode())
+            self.validator.learn(name, "list_metrics", {}, text)
+            self.server_catalog_versions[name] = hashlib.sha256(text.encode()).hexdigest()[:16]
+            if self.use_query_store:
+                query_store.register_source(
+                    self.source(name), self.environments[name], self.server_catalog_versions[name]
+                )
+        self.catalog_version = digest.hexdigest()[:16]
+        answer_cache.note_catalog(self.environment, self.catalog_version)
+        return self.catalog_version
+
+    async def call_tool(self, server_name: str, tool_name: str, arguments: Dict[str, Any]):
+        """Call a tool on one environment's MCP server and return the raw CallToolResult.
+
+        Idempotent tools are retried on failure and, for metadata tools, hedged with a
+        second request when the first is slow (see services/call_policy.py).
+        """
+        server = self.servers.get(server_name)
+        if server is None:
+            raise RuntimeError(f"Environment '{server_name}' is not connected.")
+        key = (self.source(server_name), tool_name)
+        return await hedging_caller.call(key, tool_name, lambda: server.call_tool(tool_name, arguments))
+
+    async def _invoke_tool(self, server_name: str, tool_name: str, context, input_json: str) -> str:
+        """Entry point for every tool call the agent makes."""
+        try:
+            arguments = json.loads(input_json) if input_json else {}
+        except json.JSONDecodeError as e:
+            raise ModelBehaviorError(f"Invalid JSON input for tool {tool_name}: {input_json}") from e
+
+        # Malformed calls are answered locally; the error goes back to the model to fix
+        error = self.validator.validate(server_name, tool_name, arguments)
+        if error:
+            return f"Error: {error}"
+
+        # Popular queries are pre-run in the background and answered from the local store
+        text = None
+        if tool_name == "query_metrics" and self.use_query_store:
+            source = self.source(server_name)
+            query_store.record(source, arguments)
+            text = query_store.lookup(source, self.server_catalog_versions.get(server_name), arguments)
+
+        if text is None:
+            try:
+                result = await self.call_tool(server_name, tool_name, arguments)
+            except Exception as e:
+                raise AgentsException(f"Error invoking MCP tool {tool_name} on '{server_name}': {e}") from e
+            text = _result_to_text(result)
+            if not getattr(result, "isError", False):
+                self.validator.learn(server_name, tool_name, arguments, text)
+
+        # Long time series go to the model as a summary plus a coarse series; the chart
+        # series and full-resolution data ride along in the run context for the UI.
+        if tool_name == "query_metrics":
+            # Parsing, downsampling and summarising big outputs runs in the worker pool
+            try:
+                reduced = await process_text(reduce_tool_output, text)
+            except Exception:
+                # A valid result the reducer can't handle still goes to the model as is
+                increment("postprocess.reduce_failures")
+                reduced = None
+            if reduced is not None:
+                run_state = getattr(context, "context", None)
+                call_id = getattr(context, "tool_call_id", None)
+                if isinstance(run_state, dict) and call_id:
+                    run_state.setdefault("series", {})[call_id] = {
+                        **reduced["chart"], "full_csv": reduced["full_csv"],
+                    }
+                return reduced["model_text"]
+        return text
+
     async def run(self, conversation: List[Dict[str, str]]):
         if self.agent is None:
             raise RuntimeError("Agent not initialized. Call connect() first.")
         
         try:
-            result = await Runner.run(self.agent, conversation)
+            # Per-run state shared with tool invocations (e.g. downsampled series)
+            run_state: Dict[str, Any] = {}
+            result = await Runner.run(self.agent, conversation, context=run_state)
             final_output = getattr(result, "final_output", "")
         except Exception as e:
             # Handle errors from the agent/runner
@@ -127,6 +359,8 @@ class RemoteMCPClient:
                                 "input": parsed_args,
                                 "output": "Tool executed"  # Default, will be updated if output found
                             }
+                            if call_id in run_state.get("series", {}):
+                                tool_execution["series"] = run_state["series"][call_id]
                             
                             # Store in map for output matching
                             if call_id:
@@ -168,38 +402,112 @@ class RemoteMCPClient:
         }
 
 
-async def setup_mcp_client() -> RemoteMCPClient:
-    """Initialize and connect a remote MCP client for dbt."""
+def _result_to_text(result) -> str:
+    """Flatten an MCP CallToolResult into the string handed to the model."""
+    content = getattr(result, "content", None) or []
+    if not content:
+        # Empty content is a valid result (e.g. "no results found")
+        return "[]"
+    parts = [
+        item.text if getattr(item, "type", None) == "text" else item.model_dump_json()
+        for item in content
+    ]
+    return parts[0] if len(parts) == 1 else json.dumps(parts)
+
+
+async def materialize_popular_queries(source: str, config: Dict[str, Any]) -> None:
+    """Pre-run the most requested query_metrics calls of one environment into the query store.
+
+    ``config`` carries no credentials; the calls are made with QUERY_STORE_DBT_TOKEN.
+    """
+    queries = query_store.top_queries(source)
+    if not queries:
+        return
+    headers = {**config["headers"], "Authorization": f"token {QUERY_STORE_DBT_TOKEN}"}
+    client = RemoteMCPClient(environments={"dbt": {**config, "headers": headers}}, use_query_store=False)
+    try:
+        await client.connect()
+        catalog_version = client.server_catalog_versions.get("dbt")
+        if catalog_version is None:
+            return
+        for arguments in queries:
+            result = await client.call_tool("dbt", "query_metrics", arguments)
+            if not getattr(result, "isError", False):
+                query_store.save(source, catalog_version, arguments, _result_to_text(result))
+    finally:
+        await client.close()
+        await close_shared_transport()
+
+
+def parse_environments(spec: str, default_host: str) -> Dict[str, Dict[str, str]]:
+    """Parse ``name=environment_id[@host]`` entries separated by commas."""
+    environments: Dict[str, Dict[str, str]] = {}
+    for entry in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, sep, target = entry.partition("=")
+        name, target = name.strip(), target.strip()
+        if not sep or not target or not _ENVIRONMENT_NAME_RE.match(name):
+            raise ValueError(
+                f"Invalid environment '{entry}'. Use name=environment_id or name=environment_id@host "
+                "(names may contain letters, digits, '_' and '-')."
+            )
+        env_id, _, host = target.partition("@")
+        environments[name] = {"env_id": env_id.strip(), "host": host.strip() or default_host}
+    return environments
+
+
+async def setup_mcp_client(model: Optional[Union[str, Model]] = None,
+                           use_query_store: bool = True) -> RemoteMCPClient:
+    """Initialize and connect a remote MCP client for dbt.
+
+    The production environment (DBT_PROD_ENV_ID) is always connected as ``prod``;
+    DBT_ENVIRONMENTS adds further environments, e.g. ``staging=12345,emea=678@emea.dbt.com``.
+    ``model`` overrides the agents SDK default model; ``use_query_store=False`` sends every
+    query_metrics call to the dbt Semantic Layer without recording it.
+    """
     dbt_token = os.getenv("DBT_TOKEN")
     prod_env_id = os.getenv("DBT_PROD_ENV_ID")
 
     if not dbt_token or not prod_env_id:
         raise ValueError("Missing required dbt credentials. Please provide DBT_TOKEN and DBT_PROD_ENV_ID.")
     
-    # Prefer explicit MCP URL if provided; otherwise construct from host
-    url = os.getenv("DBT_MCP_URL")
-    if not url:
-        host = os.getenv("DBT_HOST", "cloud.getdbt.com")
-        url = f"https://{host}/api/ai/v1/mcp/"
-
-    headers = {
-        "Authorization": f"token {dbt_token}",
-        "x-dbt-prod-environment-id": prod_env_id,
-        # Disable SQL tools that require additional headers (x-dbt-user-id, x-dbt-dev-environment-id)
-        "x-dbt-disable-tools": "text_to_sql,execute_sql",
-    }
+    host = os.getenv("DBT_HOST", "cloud.getdbt.com")
+    specs = {"prod": {"env_id": prod_env_id, "host": host}}
+    specs.update(parse_environments(os.getenv("DBT_ENVIRONMENTS", ""), host))
+
+    environments = {}
+    for name, spec in specs.items():
+        # Prefer explicit MCP URL for the primary host; otherwise construct from host
+        url = os.getenv("DBT_MCP_URL") if spec["host"] == host else None
+        if not url:
+            url = f"https://{spec['host']}/api/ai/v1/mcp/"
+        environments[name] = {
+            "url": url,
+            "headers": {
+                "Authorization": f"token {dbt_token}",
+                "x-dbt-prod-environment-id": spec["env_id"],
+                # Disable SQL tools that require additional headers (x-dbt-user-id, x-dbt-dev-environment-id)
+                "x-dbt-disable-tools": "text_to_sql,execute_sql",
+            },
+        }
 
     try:
-        client = RemoteMCPClient(url=url, headers=headers)
+        client = RemoteMCPClient(environments=environments, model=model, use_query_store=use_query_store)
         return await client.connect()
     except Exception as e:
         # Provide more detailed error information
-        error_msg = f"Failed to connect to dbt MCP server at {url}: {str(e)}"
+        urls = ", ".join(sorted({cfg["url"] for cfg in environments.values()}))
+        error_msg = f"Failed to connect to dbt MCP server at {urls}: {str(e)}"
         raise ConnectionError(error_msg) from e
 
 
-async def run_agent(client: "RemoteMCPClient", message: str, api_key: str) -> Dict:
-    """Run a single turn with the simple Agent/Runner using the connected MCP server."""
+async def run_agent(client: "RemoteMCPClient", message: str, api_key: str,
+                    use_cache: bool = True, history: Optional[List[Dict]] = None) -> Dict:
+    """Run a single turn with the simple Agent/Runner using the connected MCP server.
+
+    Standalone questions (no earlier assistant reply in the chat) are answered from
+    the answer cache when possible; pass use_cache=False to force a fresh run.
+    ``history`` overrides the chat messages otherwise read from the Streamlit session.
+    """
     # Ensure OpenAI key is available to the agents SDK
     if api_key:
         os.environ["OPENAI_API_KEY"] = api_key
@@ -207,7 +515,8 @@ async def run_agent(client: "RemoteMCPClient", message: str, api_key: str) -> Di
     # Include prior chat history if available
     history_messages: List[Dict[str, str]] = []
     try:
-        for msg in st.session_state.get("messages", []):
+        messages = history if history is not None else st.session_state.get("messages", [])
+        for msg in messages:
             role = msg.get("role")
             content = msg.get("content")
             if role and content:
@@ -216,9 +525,35 @@ async def run_agent(client: "RemoteMCPClient", message: str, api_key: str) -> Di
         pass
 
     conversation = history_messages + [{"role": "user", "content": message}]
-    
+
+    # Long-lived sessions re-fingerprint the catalog now and then, so a catalog change
+    # drops the older answers instead of serving them until they expire
+    if (client.catalog_version is not None
+            and time.monotonic() - client.catalog_checked_at > ANSWER_CACHE_CATALOG_CHECK_SECONDS):
+        await client.refresh_catalog_version()
+
+    # Follow-up questions depend on the conversation, so only standalone ones are cached
+    cacheable = client.catalog_version is not None and not any(
+        m["role"] == "assistant" for m in history_messages
+    )
+    available_tools = [t["name"] for t in client.get_tools()]
+    if not use_cache and client.catalog_version is not None:
+        answer_cache.discard(client.environment, client.catalog_version, message)
+    if cacheable and use_cache:
+        hit = answer_cache.lookup(client.environment, client.catalog_version, message, available_tools)
+        if hit:
+            return {
+                "output": hit["output"],
+                "tool_executions": hit["tool_executions"],
+                "cached": True,
+                "cached_at": hit["cached_at"],
+            }
+
     try:
-        return await client.run(conversation)
+        response = await client.run(conversation)
+        if cacheable and not response.get("error"):
+            answer_cache.store(client.environment, client.catalog_version, message, response)
+        return response
     except Exception as e:
         error_msg = str(e)
         # Return a structured error response
@@ -254,19 +589,27 @@ def connect_to_mcp_servers():
     try:
         with st.spinner("🚀 Connecting to dbt MCP server..."):
             st.session_state.client = run_async(setup_mcp_client())
-            # Populate tools dynamically from MCP using list_tools
-            st.session_state.tools = run_async(st.session_state.client.fetch_tools())
+            # Tools are listed from every environment during connect
+            st.session_state.tools = st.session_state.client.get_tools()
+            st.session_state.servers = {
+                name: cfg["url"] for name, cfg in st.session_state.client.environments.items()
+            }
             st.session_state.agent = None  # Kept for compatibility elsewhere
-            st.success(f"✅ Connected to dbt MCP! {len(st.session_state.tools)} tools available.")
+            st.success(
+                f"✅ Connected to {len(st.session_state.servers)} dbt MCP environment(s)! "
+                f"{len(st.session_state.tools)} tools available."
+            )
     except ValueError as e:
         st.error(f"❌ Configuration Error: {e}")
         st.session_state.client = None
         st.session_state.tools = []
+        st.session_state.servers = {}
         st.session_state.agent = None
     except Exception as e:
         st.error(f"❌ Failed to connect to dbt MCP server: {e}")
         st.session_state.client = None
         st.session_state.tools = []
+        st.session_state.servers = {}
         st.session_state.agent = None
 
 
@@ -279,4 +622,5 @@ def disconnect_from_mcp_servers():
             pass
     st.session_state.client = None
     st.session_state.tools = []
+    st.session_state.servers = {}
     st.session_state.agent = None
\ No newline at end of file
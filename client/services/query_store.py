@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import atexit
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.async_helpers import suppress_async_warnings
+from utils.instrumentation import increment
+
+# Local store for results of popular query_metrics calls, pre-run in the background
+QUERY_STORE_ENABLED = os.getenv("QUERY_STORE_ENABLED", "1").lower() in ("1", "true", "yes")
+QUERY_STORE_PATH = os.getenv("QUERY_STORE_PATH", ".query_store.duckdb")
+QUERY_STORE_TOP_N = int(os.getenv("QUERY_STORE_TOP_N", "10"))
+# Argument sets requested fewer times than this are never materialized
+QUERY_STORE_MIN_HITS = int(os.getenv("QUERY_STORE_MIN_HITS", "3"))
+QUERY_STORE_REFRESH_SECONDS = float(os.getenv("QUERY_STORE_REFRESH_SECONDS", "900"))
+# Materialized results older than this are not served
+QUERY_STORE_MAX_AGE_SECONDS = float(os.getenv("QUERY_STORE_MAX_AGE_SECONDS", "3600"))
+# Dedicated dbt token for the background refresher; without it nothing is materialized.
+# Sessions' own tokens are never kept, since the results are served to every session.
+QUERY_STORE_DBT_TOKEN = os.getenv("QUERY_STORE_DBT_TOKEN", "")
+
+# DuckDB is optional; without it usage is not logged and every call goes to the server
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS query_usage (
+        source VARCHAR, arguments VARCHAR, hits BIGINT, last_requested DOUBLE,
+        PRIMARY KEY (source, arguments))""",
+    """CREATE TABLE IF NOT EXISTS query_results (
+        source VARCHAR, arguments VARCHAR, catalog_version VARCHAR, output VARCHAR,
+        refreshed_at DOUBLE, PRIMARY KEY (source, arguments))""",
+]
+
+# Refreshes one source: (source, connection config) -> None
+RefreshJob = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def arguments_key(arguments: Dict[str, Any]) -> str:
+    """Canonical form of a tool call's arguments, used as the lookup key."""
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class QueryStore:
+    """Usage log and materialized results of query_metrics calls, shared by all sessions.
+
+    A "source" identifies one dbt environment (MCP URL and environment id). Results
+    are tagged with the source's catalog version and only served while the version
+    matches and the result is younger than ``max_age``. A daemon thread re-runs the
+    ``top_n`` most requested argument sets of each source every ``refresh_interval``
+    seconds, and right away when a session sees the source's catalog change.
+    """
+
+    def __init__(self, path: str = QUERY_STORE_PATH, top_n: int = QUERY_STORE_TOP_N,
+                 min_hits: int = QUERY_STORE_MIN_HITS,
+                 refresh_interval: float = QUERY_STORE_REFRESH_SECONDS,
+                 max_age: float = QUERY_STORE_MAX_AGE_SECONDS):
+        self.path = path
+        self.top_n = top_n
+        self.min_hits = min_hits
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._conn = None
+        self._lock = threading.Lock()
+        # source -> {"config": MCP connection config without credentials, "catalog_version": ...}
+        self._sources: Dict[str, Dict[str, Any]] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    @property
+    def available(self) -> bool:
+        return QUERY_STORE_ENABLED and duckdb is not None
+
+    def _connection(self):
+        # Callers hold self._lock
+        if self._conn is None:
+            try:
+                self._conn = duckdb.connect(self.path)
+            except duckdb.Error:
+                # The file is locked by another process (e.g. a batch run): keep results in memory
+                self._conn = duckdb.connect(":memory:")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        return self._conn
+
+    def record(self, source: str, arguments: Dict[str, Any]) -> None:
+        """Log one request of an argument set."""
+        if not self.available:
+            return
+        with self._lock:
+            self._connection().execute(
+                """INSERT INTO query_usage VALUES (?, ?, 1, ?)
+                   ON CONFLICT (source, arguments) DO UPDATE
+                   SET hits = hits + 1, last_requested = excluded.last_requested""",
+                [source, arguments_key(arguments), time.time()],
+            )
+
+    def lookup(self, source: str, catalog_version: Optional[str], arguments: Dict[str, Any]) -> Optional[str]:
+        """Materialized output for these arguments, if fresh for the current catalog."""
+        if not self.available or catalog_version is None:
+            return None
+        with self._lock:
+            row = self._connection().execute(
+                """SELECT output FROM query_results
+                   WHERE source = ? AND arguments = ? AND catalog_version = ? AND refreshed_at >= ?""",
+                [source, arguments_key(arguments), catalog_version, time.time() - self.max_age],
+            ).fetchone()
+        increment("query_store.hits" if row else "query_store.misses")
+        return row[0] if row else None
+
+    def save(self, source: str, catalog_version: str, arguments: Dict[str, Any], output: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO query_results VALUES (?, ?, ?, ?, ?)",
+                [source, arguments_key(arguments), catalog_version, output, time.time()],
+            )
+        increment("query_store.materialized")
+
+    def top_queries(self, source: str) -> List[Dict[str, Any]]:
+        """The most requested argument sets of a source, most popular first."""
+        with self._lock:
+            rows = self._connection().execute(
+                """SELECT arguments FROM query_usage
+                   WHERE source = ? AND hits >= ?
+                   ORDER BY hits DESC, last_requested DESC LIMIT ?""",
+                [source, self.min_hits, self.top_n],
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def register_source(self, source: str, config: Dict[str, Any], catalog_version: Optional[str]) -> None:
+        """Remember how to reach a source; a changed catalog triggers a refresh.
+
+        The session's credentials are dropped: the refresher uses QUERY_STORE_DBT_TOKEN.
+        """
+        if not self.available:
+            return
+        headers = {k: v for k, v in config.get("headers", {}).items() if k.lower() != "authorization"}
+        config = {**config, "headers": headers}
+        with self._lock:
+            entry = self._sources.setdefault(source, {})
+            changed = entry.get("catalog_version") != catalog_version
+            entry.update(config=config, catalog_version=catalog_version)
+        if changed:
+            self._wake.set()
+
+    def start_refresher(self, job: RefreshJob) -> None:
+        """Start the background refresh thread once per process, if it has a token."""
+        with self._lock:
+            if self._refresher is not None or not self.available or not QUERY_STORE_DBT_TOKEN:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_forever, args=(job,), name="query-store-refresh", daemon=True,
+            )
+            self._refresher.start()
+        atexit.register(self.shutdown)
+
+    def _refresh_forever(self, job: RefreshJob) -> None:
+        # The refresher has its own event loop and MCP connections, independent of sessions
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.refresh_interval)
+                self._wake.clear()
+                if self._stop.is_set():
+                    break
+                with self._lock:
+                    sources = [(s, e["config"]) for s, e in self._sources.items()]
+                for source, config in sources:
+                    try:
+                        with suppress_async_warnings():
+                            loop.run_until_complete(job(source, config))
+                    except Exception:
+                        # Keep serving older results; the next cycle retries
+                        increment("query_store.refresh_errors")
+        finally:
+            loop.close()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+query_store = QueryStore()
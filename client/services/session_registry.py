@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import atexit
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+from streamlit.runtime import Runtime
+
+from services.http_transport import close_shared_transport
+from utils.async_helpers import suppress_async_warnings
+
+SESSION_IDLE_TIMEOUT_SECONDS = float(os.getenv("SESSION_IDLE_TIMEOUT_SECONDS", "1800"))
+SESSION_REAP_INTERVAL_SECONDS = float(os.getenv("SESSION_REAP_INTERVAL_SECONDS", "60"))
+
+# Session state keys holding chat history, released once a reaped session has disconnected
+_RELEASED_KEYS = ["history_chats", "messages", "current_chat_id", "current_chat_index", "tool_executions"]
+
+
+def _deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Approximate retained size of a structure of dicts, lists and scalars, in bytes."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def session_footprint(state) -> Dict[str, int]:
+    """Memory accounting for one session: chat messages, tool outputs and open connections."""
+    chats = state["history_chats"] if "history_chats" in state else []
+    messages = [m for chat in chats for m in chat.get("messages", [])]
+    tool_outputs = [m[key] for m in messages for key in ("tool_executions", "charts") if m.get(key)]
+    if "tool_executions" in state:
+        tool_outputs.append(state["tool_executions"])
+    client = state["client"] if "client" in state else None
+    return {
+        "chats": len(chats),
+        "messages": len(messages),
+        "message_bytes": sum(_deep_sizeof(m.get("content", "")) for m in messages),
+        "tool_output_bytes": _deep_sizeof(tool_outputs),
+        "connections": len(getattr(client, "servers", {}) or {}),
+    }
+
+
+class SessionRegistry:
+    """Process-wide registry of live Streamlit sessions.
+
+    Sessions report activity with ``touch`` on every rerun. A daemon thread closes the
+    MCP connections and event loop of sessions idle for longer than ``idle_timeout``.
+    Chat history is only released once Streamlit reports the session disconnected, so
+    an idle tab that is still open keeps its chats and just has to reconnect.
+    """
+
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT_SECONDS,
+                 reap_interval: float = SESSION_REAP_INTERVAL_SECONDS):
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> None:
+        if self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap_forever, name="session-reaper", daemon=True)
+        self._reaper.start()
+        atexit.register(self.shutdown)
+
+    def touch(self, session_id: str, state) -> threading.RLock:
+        """Record activity for a session and return the lock guarding its event loop."""
+        with self._lock:
+            self._ensure_started()
+            record = self._sessions.get(session_id)
+            if record is None:
+                record = {
+                    "session_id": session_id,
+                    "state": state,
+                    "created_at": time.time(),
+                    "lock": threading.RLock(),
+                }
+                self._sessions[session_id] = record
+            record["last_seen"] = time.time()
+            record["closed"] = False
+        # Wait for an in-flight reap of this session to finish
+        with record["lock"]:
+            pass
+        return record["lock"]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Live sessions with their idle time and memory footprint, most recent first."""
+        with self._lock:
+            records = list(self._sessions.values())
+        now = time.time()
+        rows = []
+        for record in records:
+            row = {
+                "session": record["session_id"][:8],
+                "idle_s": int(now - record["last_seen"]),
+                "age_s": int(now - record["created_at"]),
+            }
+            try:
+                row.update(session_footprint(record["state"]))
+            except Exception:
+                # The session may be mid-rerun; report what we have
+                pass
+            rows.append(row)
+        return sorted(rows, key=lambda r: r["idle_s"])
+
+    def _reap_forever(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            self.reap_idle()
+
+    @staticmethod
+    def _is_connected(session_id: str) -> bool:
+        # Without a Streamlit runtime (e.g. in tests) there is no way to tell; keep the history
+        if not Runtime.exists():
+            return True
+        return Runtime.instance().is_active_session(session_id)
+
+    def reap_idle(self) -> int:
+        """Close every session idle for longer than the timeout. Returns how many were reaped."""
+        now = time.time()
+        with self._lock:
+            idle = [r for r in self._sessions.values() if now - r["last_seen"] > self.idle_timeout]
+
+        reaped = 0
+        for record in idle:
+            # Skip sessions that are running a request right now
+            if not record["lock"].acquire(blocking=False):
+                continue
+            try:
+                if time.time() - record["last_seen"] <= self.idle_timeout:
+                    continue
+                connected = self._is_connected(record["session_id"])
+                if connected and record["closed"]:
+                    # Already closed; the history stays until the tab goes away
+                    continue
+                self._release(record["state"], release_history=not connected)
+                if connected:
+                    record["closed"] = True
+                else:
+                    with self._lock:
+                        self._sessions.pop(record["session_id"], None)
+                reaped += 1
+            finally:
+                record["lock"].release()
+        return reaped
+
+    def _release(self, state, release_history: bool = True) -> None:
+        client = state["client"] if "client" in state else None
+        loop = state["loop"] if "loop" in state else None
+        with suppress_async_warnings():
+            if loop is not None and not loop.is_closed():
+                try:
+                    if client is not None:
+                        loop.run_until_complete(client.close())
+                    loop.run_until_complete(close_shared_transport())
+                    pending = asyncio.all_tasks(loop)
+                    for task in pending:
+                        task.cancel()
+                    if pending:
+                        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                except Exception:
+                    # Best effort: the loop is closed below regardless
+                    pass
+                loop.close()
+
+        for key in (_RELEASED_KEYS if release_history else []) + ["loop"]:
+            if key in state:
+                del state[key]
+        state["client"] = None
+        state["agent"] = None
+        state["tools"] = []
+        state["servers"] = {}
+        state["session_expired"] = True
+
+    def shutdown(self) -> None:
+        """Release every session; registered with atexit once per process."""
+        self._stop.set()
+        with self._lock:
+            records = list(self._sessions.values())
+            self._sessions.clear()
+        for record in records:
+            try:
+                self._release(record["state"])
+            except Exception:
+                # During shutdown there is nobody left to report to
+                pass
+
+
+session_registry = SessionRegistry()
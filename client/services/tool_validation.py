@@ -0,0 +1,184 @@
+import json
+import threading
+from difflib import get_close_matches
+from typing import Any, Dict, FrozenSet, List, Optional, Set
+
+from jsonschema.exceptions import SchemaError, best_match
+from jsonschema.validators import validator_for
+
+from utils.instrumentation import increment
+
+# Tools whose `metrics` argument must name metrics from the catalog
+_METRIC_TOOLS = {"get_dimensions", "get_entities", "query_metrics"}
+
+
+def _names(text: str) -> Optional[List[Dict[str, Any]]]:
+    """Items with a "name" from a JSON list tool output, or None if there are none.
+
+    None leaves that part of the catalog unknown, so checks against it are skipped.
+    """
+    try:
+        items = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(items, list):
+        return None
+    named = []
+    for item in items:
+        if isinstance(item, str):
+            # FastMCP returns list[Model] as one JSON text block per item
+            try:
+                item = json.loads(item)
+            except ValueError:
+                continue
+        if isinstance(item, dict) and item.get("name"):
+            named.append(item)
+    return named or None
+
+
+def _group_by_entries(group_by) -> List[Dict[str, Any]]:
+    entries = []
+    for item in group_by or []:
+        if isinstance(item, str):
+            entries.append({"name": item})
+        elif isinstance(item, dict) and item.get("name"):
+            entries.append(item)
+    return entries
+
+
+class _Catalog:
+    """What one environment's Semantic Layer has told us so far."""
+
+    def __init__(self):
+        self.metrics: Optional[Set[str]] = None
+        # metric set -> queryable dimension (or entity) names for exactly that set
+        self.dimensions: Dict[FrozenSet[str], Set[str]] = {}
+        self.entities: Dict[FrozenSet[str], Set[str]] = {}
+        # time dimension name -> queryable grains (upper case)
+        self.grains: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def names_for(known: Dict[FrozenSet[str], Set[str]], metrics: FrozenSet[str]) -> Optional[Set[str]]:
+        if metrics in known:
+            return known[metrics]
+        singles = [known.get(frozenset([m])) for m in metrics]
+        if singles and all(s is not None for s in singles):
+            return set.intersection(*singles)
+        return None
+
+
+class ToolArgumentValidator:
+    """Rejects malformed tool calls locally instead of paying a round trip to the MCP server.
+
+    Input schemas from list_tools are compiled once. Metric, dimension and grain names
+    are checked against the catalog learned from list_metrics/get_dimensions/get_entities
+    outputs; checks are skipped while the relevant part of the catalog is unknown.
+    """
+
+    def __init__(self):
+        self._validators: Dict[tuple, Any] = {}
+        self._catalogs: Dict[str, _Catalog] = {}
+        self._lock = threading.Lock()
+
+    def compile(self, server_name: str, tool_name: str, schema: Optional[Dict]) -> None:
+        if not schema:
+            return
+        cls = validator_for(schema)
+        try:
+            cls.check_schema(schema)
+        except SchemaError:
+            # Let the server judge arguments for tools with schemas we can't use
+            return
+        self._validators[(server_name, tool_name)] = cls(schema)
+
+    def _catalog(self, server_name: str) -> _Catalog:
+        with self._lock:
+            return self._catalogs.setdefault(server_name, _Catalog())
+
+    def learn(self, server_name: str, tool_name: str, arguments: Dict, output: str) -> None:
+        """Update the catalog from a successful metadata tool output."""
+        if tool_name not in ("list_metrics", "get_dimensions", "get_entities"):
+            return
+        items = _names(output)
+        if items is None:
+            return
+        catalog = self._catalog(server_name)
+        names = {item["name"] for item in items}
+        if tool_name == "list_metrics":
+            catalog.metrics = names
+            return
+
+        key = frozenset(arguments.get("metrics") or [])
+        if not key:
+            return
+        with self._lock:
+            known = catalog.dimensions if tool_name == "get_dimensions" else catalog.entities
+            known[key] = names
+            for item in items:
+                grains = item.get("queryable_granularities")
+                if grains:
+                    catalog.grains[item["name"]] = {str(g).upper() for g in grains}
+
+    def validate(self, server_name: str, tool_name: str, arguments: Dict) -> Optional[str]:
+        """Return a precise error message for invalid arguments, or None to forward the call."""
+        error = self._check(server_name, tool_name, arguments)
+        if error:
+            increment("tool_validation.rejected")
+            increment(f"tool_validation.rejected.{tool_name}")
+        else:
+            increment("tool_validation.forwarded")
+        return error
+
+    def _check(self, server_name: str, tool_name: str, arguments: Dict) -> Optional[str]:
+        validator = self._validators.get((server_name, tool_name))
+        if validator is not None:
+            error = best_match(validator.iter_errors(arguments))
+            if error is not None:
+                location = "/".join(str(p) for p in error.absolute_path) or "arguments"
+                return f"Invalid arguments for {tool_name} at '{location}': {error.message}"
+
+        if tool_name not in _METRIC_TOOLS:
+            return None
+        catalog = self._catalog(server_name)
+        metrics = arguments.get("metrics") or []
+        if catalog.metrics is not None:
+            for metric in metrics:
+                if metric not in catalog.metrics:
+                    return self._unknown("metric", metric, catalog.metrics, "list_metrics")
+
+        if tool_name != "query_metrics":
+            return None
+        key = frozenset(metrics)
+        dimensions = catalog.names_for(catalog.dimensions, key)
+        entities = catalog.names_for(catalog.entities, key)
+        for entry in _group_by_entries(arguments.get("group_by")):
+            name = entry["name"]
+            if str(entry.get("type", "")).lower() == "entity":
+                if entities is not None and name not in entities:
+                    return self._unknown("entity", name, entities, "get_entities", metrics)
+            elif dimensions is not None and name not in dimensions:
+                # Grains may be given as a suffix, e.g. metric_time__month
+                base, _, suffix = name.rpartition("__")
+                if base in catalog.grains and suffix.upper() in catalog.grains[base]:
+                    continue
+                # An untyped name may still be an entity, so it must be ruled out there too
+                typed = entry.get("type") in ("dimension", "time_dimension")
+                if typed or (entities is not None and name not in entities):
+                    return self._unknown(
+                        "dimension", name, dimensions | (entities or set()), "get_dimensions", metrics
+                    )
+            grain = entry.get("grain")
+            if grain and name in catalog.grains and str(grain).upper() not in catalog.grains[name]:
+                allowed = ", ".join(sorted(catalog.grains[name]))
+                return f"Invalid grain '{grain}' for {name}. Queryable grains: {allowed}."
+        return None
+
+    @staticmethod
+    def _unknown(kind: str, name: str, known: Set[str], lookup_tool: str,
+                 metrics: Optional[List[str]] = None) -> str:
+        scope = f" for metrics {', '.join(metrics)}" if metrics else ""
+        message = f"Unknown {kind} '{name}'{scope}."
+        suggestions = get_close_matches(name, sorted(known), n=3)
+        if suggestions:
+            message += f" Did you mean: {', '.join(suggestions)}?"
+        return message + f" Use {lookup_tool} to see valid names."
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+from mcp.types import CallToolResult, TextContent
+
+from services import mcp_service
+from services.answer_cache import AnswerCache
+from services.mcp_service import RemoteMCPClient, run_agent
+
+ENV, VERSION = "dbt=http://mcp|1", "v1"
+
+
+def _cache_with(question):
+    cache = AnswerCache()
+    cache.store(ENV, VERSION, question, {"output": f"answer to {question}", "tool_executions": []})
+    return cache
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("revenue excluding refunds by month", "revenue including refunds by month"),
+    ("top customers by revenue ascending", "top customers by revenue descending"),
+    ("revenue by month in 2023", "revenue by month in 2024"),
+])
+def test_one_different_word_is_a_miss(cached, asked):
+    assert _cache_with(cached).lookup(ENV, VERSION, asked, []) is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What was revenue by month?", "Show me the revenue by month please"),
+    ("revenue excluding refunds by month", "Revenue excluding refund, by month"),
+])
+def test_rephrasings_hit(cached, asked):
+    hit = _cache_with(cached).lookup(ENV, VERSION, asked, [])
+    assert hit is not None and hit["output"] == f"answer to {cached}"
+
+
+def test_full_resolution_data_is_not_cached():
+    series = {"rows": [], "full_row_count": 20000, "full_csv": "a,b\n" * 100000}
+    response = {"output": "chart", "tool_executions": [{"tool_name": "query_metrics", "series": series}]}
+    cache = AnswerCache()
+    cache.store(ENV, VERSION, "daily revenue", response)
+
+    cached = cache.lookup(ENV, VERSION, "daily revenue", ["query_metrics"])
+    assert "full_csv" not in cached["tool_executions"][0]["series"]
+    assert cached["tool_executions"][0]["series"]["full_row_count"] == 20000
+    # The live response handed to the UI is left intact
+    assert "full_csv" in response["tool_executions"][0]["series"]
+
+
+def test_long_lived_session_notices_a_catalog_change():
+    catalog = {"metrics": [{"name": "revenue"}]}
+    client = RemoteMCPClient(url="http://mcp", headers={}, use_query_store=False)
+    client.servers = {"dbt": object()}
+    client._tools_metadata = [{"name": "list_metrics", "server": "dbt", "tool": "list_metrics"}]
+    runs = []
+
+    async def call_tool(server_name, tool_name, arguments):
+        if catalog.get("down"):
+            raise ConnectionError("down")
+        return CallToolResult(content=[TextContent(type="text", text=json.dumps(catalog["metrics"]))])
+
+    async def run(conversation):
+        runs.append(conversation)
+        return {"output": f"answer {len(runs)}", "tool_executions": []}
+
+    client.call_tool, client.run = call_tool, run
+    ask = lambda: asyncio.run(run_agent(client, "total revenue", "", history=[]))
+
+    asyncio.run(client.refresh_catalog_version())
+    assert ask()["output"] == "answer 1"
+    assert ask().get("cached")
+
+    # Within the check interval the catalog is not re-read
+    catalog["metrics"] = [{"name": "revenue"}, {"name": "orders"}]
+    assert ask().get("cached")
+
+    client.catalog_checked_at -= mcp_service.ANSWER_CACHE_CATALOG_CHECK_SECONDS + 1
+    assert ask()["output"] == "answer 2"
+
+    # A failed re-check keeps the cache
+    catalog["down"] = True
+    client.catalog_checked_at -= mcp_service.ANSWER_CACHE_CATALOG_CHECK_SECONDS + 1
+    assert ask().get("cached")
@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+from mcp.shared.exceptions import McpError
+from mcp.types import INVALID_PARAMS, ErrorData
+
+from services import call_policy
+from services.call_policy import DEFAULT_POLICIES, HedgingCaller
+from utils.instrumentation import get_counters
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(call_policy, "MCP_RETRY_BACKOFF_MS", 0)
+
+
+def _flaky(*errors, result="ok", delay=0.0):
+    """An attempt that raises ``errors`` in turn, then returns ``result``; counts its calls."""
+    calls = []
+
+    async def attempt():
+        calls.append(len(calls))
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        await asyncio.sleep(delay)
+        return result
+    return attempt, calls
+
+
+def _call(caller, tool_name, attempt):
+    return asyncio.run(caller.call(("dbt", tool_name), tool_name, attempt))
+
+
+def _timeout():
+    return McpError(ErrorData(code=httpx.codes.REQUEST_TIMEOUT, message="Timed out"))
+
+
+def test_transient_errors_are_retried():
+    attempt, calls = _flaky(httpx.ConnectError("refused"), _timeout())
+    assert _call(HedgingCaller(DEFAULT_POLICIES), "get_dimensions", attempt) == "ok"
+    assert len(calls) == 3
+
+
+def test_server_errors_are_not_retried():
+    attempt, calls = _flaky(McpError(ErrorData(code=INVALID_PARAMS, message="bad metric")))
+    with pytest.raises(McpError):
+        _call(HedgingCaller(DEFAULT_POLICIES), "get_dimensions", attempt)
+    assert len(calls) == 1
+
+
+def test_query_metrics_is_not_retried_after_a_timeout():
+    caller = HedgingCaller(DEFAULT_POLICIES)
+
+    attempt, calls = _flaky(_timeout())
+    with pytest.raises(McpError):
+        _call(caller, "query_metrics", attempt)
+    assert len(calls) == 1
+
+    attempt, calls = _flaky(httpx.ConnectError("refused"))
+    assert _call(caller, "query_metrics", attempt) == "ok"
+    assert len(calls) == 2
+
+
+def test_retries_draw_from_the_budget():
+    caller = HedgingCaller(DEFAULT_POLICIES)
+    caller._tokens = 0
+    skipped = get_counters("mcp_hedge.").get("mcp_hedge.retries_skipped_budget", 0)
+
+    attempt, calls = _flaky(httpx.ConnectError("refused"))
+    with pytest.raises(httpx.ConnectError):
+        _call(caller, "get_dimensions", attempt)
+    assert len(calls) == 1
+    assert get_counters("mcp_hedge.")["mcp_hedge.retries_skipped_budget"] == skipped + 1
+
+
+def test_slow_call_is_hedged_within_the_budget(monkeypatch):
+    monkeypatch.setattr(call_policy, "MCP_HEDGE_DEFAULT_DELAY_MS", 20)
+    caller = HedgingCaller(DEFAULT_POLICIES)
+    calls = []
+
+    async def attempt():
+        calls.append(len(calls))
+        # The first request hangs; the hedge answers right away
+        await asyncio.sleep(5 if len(calls) == 1 else 0)
+        return len(calls)
+
+    tokens = caller._tokens
+    assert _call(caller, "list_metrics", attempt) == 2
+    earned = min(call_policy.MCP_HEDGE_BURST, tokens + call_policy.MCP_HEDGE_BUDGET)
+    assert caller._tokens == pytest.approx(earned - 1)
+
+
+def test_unlisted_tools_are_called_once():
+    attempt, calls = _flaky(httpx.ConnectError("refused"))
+    with pytest.raises(httpx.ConnectError):
+        _call(HedgingCaller(DEFAULT_POLICIES), "text_to_sql", attempt)
+    assert len(calls) == 1
@@ -0,0 +1,59 @@
+import sqlite3
+import time
+
+import pytest
+
+from services.chat_search import ChatSearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ChatSearchIndex(str(tmp_path / "chats.db"))
+    if not index.available:
+        pytest.skip("SQLite without FTS5")
+    return index
+
+
+def _store(index, owner, chat_id):
+    index.index_message(owner, chat_id, "Revenue", 0, {"role": "user", "content": "revenue by month"})
+
+
+def test_purge_expired_applies_session_and_user_retention(index):
+    _store(index, "session:abc", "anonymous")
+    _store(index, "user:a@example.com", "signed-in")
+
+    # A day and a bit later only the anonymous session's chat has expired
+    assert index.purge_expired(now=time.time() + 25 * 3600) == 1
+    assert index.search("session:abc", "revenue") == []
+    assert index.load_chat("user:a@example.com", "signed-in") is not None
+
+    assert index.purge_expired(now=time.time() + 91 * 86400) == 1
+    assert index.search("user:a@example.com", "revenue") == []
+    assert index.load_chat("user:a@example.com", "signed-in") is None
+
+
+def test_replaced_message_is_reindexed(index):
+    owner = "user:a@example.com"
+    index.index_message(owner, "chat", "Revenue", 0, {"role": "user", "content": "revenue by month"})
+    index.index_message(owner, "chat", "Revenue", 1, {"role": "assistant", "content": "stale answer"},
+                        [{"tool_name": "query_metrics", "output": "oldvalue"}])
+
+    index.index_message(owner, "chat", "Revenue", 1, {"role": "assistant", "content": "fresh answer"},
+                        [{"tool_name": "query_metrics", "output": "newvalue"}], replace=True)
+
+    assert index.search(owner, "stale") == [] and index.search(owner, "oldvalue") == []
+    assert [hit["chat_id"] for hit in index.search(owner, "fresh")] == ["chat"]
+    assert [hit["chat_id"] for hit in index.search(owner, "newvalue")] == ["chat"]
+    messages = index.load_chat(owner, "chat")["messages"]
+    assert [m["content"] for m in messages] == ["revenue by month", "fresh answer"]
+
+
+def test_deleted_chats_leave_no_index_rows(index):
+    for n in range(3):
+        _store(index, "user:a@example.com", f"chat {n}")
+    index.delete_chat("user:a@example.com", "chat 0")
+    index.purge_expired(now=time.time() + 91 * 86400)
+
+    with sqlite3.connect(index.path) as conn:
+        assert conn.execute("SELECT count(*) FROM search").fetchone()[0] == 0
+        assert conn.execute("SELECT count(*) FROM search_rows").fetchone()[0] == 0
@@ -0,0 +1,51 @@
+import datetime
+import json
+
+from utils.downsampling import reduce_tool_output
+
+
+def _strict_json(text):
+    def reject(constant):
+        raise ValueError(f"invalid JSON constant {constant}")
+    return json.loads(text, parse_constant=reject)
+
+
+def test_null_groups_are_kept_and_summary_is_valid_json():
+    start = datetime.date(2015, 1, 1)
+    rows = [
+        {"METRIC_TIME__DAY": (start + datetime.timedelta(days=day)).isoformat(), "REGION": region,
+         "REVENUE": None if day == 0 else float(day)}
+        for day in range(3000)
+        for region in ("EU", None)
+    ]
+
+    reduced = reduce_tool_output(json.dumps(rows), max_points=200, model_points=50)
+
+    model = _strict_json(reduced["model_text"])
+    summary = model["summary"]
+    assert summary["groups"] == 2
+    assert {g["REGION"] for g in summary["top_groups"]} == {"EU", None}
+    assert summary["metrics"]["REVENUE"]["first"] is None
+    assert {r["REGION"] for r in model["downsampled_rows"]} == {"EU", None}
+    assert len({r["series"] for r in reduced["chart"]["rows"]}) == 2
+
+
+def test_many_groups_stay_within_the_point_budget():
+    start = datetime.date(2024, 1, 1)
+    rows = [
+        {"METRIC_TIME__DAY": (start + datetime.timedelta(days=day)).isoformat(),
+         "CUSTOMER": f"customer {customer}", "REVENUE": float(customer)}
+        for customer in range(3000)
+        for day in range(10)
+    ]
+
+    reduced = reduce_tool_output(json.dumps(rows), max_points=500, model_points=100)
+
+    model = _strict_json(reduced["model_text"])
+    assert len(model["downsampled_rows"]) <= 100
+    assert reduced["chart"]["points"] <= 500
+    assert model["summary"]["groups"] == 3000
+    customers = {r["CUSTOMER"] for r in model["downsampled_rows"]}
+    assert "customer 2999" in customers and "(other)" in customers
+    other = [r for r in model["downsampled_rows"] if r["CUSTOMER"] == "(other)"]
+    assert other[0]["REVENUE"] == sum(range(3000 - 32))
@@ -0,0 +1,21 @@
+import asyncio
+
+from agents import Agent, Runner, function_tool
+
+from loadtest.fake_model import ScriptedModel
+
+
+@function_tool
+def list_metrics() -> str:
+    return "[]"
+
+
+def test_streamed_run_follows_the_script():
+    async def run():
+        agent = Agent(name="Assistant", model=ScriptedModel(script=[("list_metrics", {})]), tools=[list_metrics])
+        result = Runner.run_streamed(agent, "Which metrics are there?")
+        async for _ in result.stream_events():
+            pass
+        return result.final_output
+
+    assert asyncio.run(run()) == "Scripted answer after 1 tool calls (2 chars of data)."
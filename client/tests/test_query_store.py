@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from services import mcp_service, query_store as query_store_module
+from services.query_store import QueryStore
+
+CONFIG = {"url": "http://mcp", "headers": {"Authorization": "token user-token", "x-dbt-prod-environment-id": "1"}}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = QueryStore(path=str(tmp_path / "queries.duckdb"), min_hits=1)
+    if not store.available:
+        pytest.skip("duckdb not installed")
+    monkeypatch.setattr(mcp_service, "query_store", store)
+    yield store
+    store.shutdown()
+
+
+def test_sources_keep_no_session_credentials(store):
+    store.register_source("http://mcp|1", CONFIG, "v1")
+
+    kept = store._sources["http://mcp|1"]["config"]
+    assert kept["headers"] == {"x-dbt-prod-environment-id": "1"}
+    assert CONFIG["headers"]["Authorization"] == "token user-token"
+
+
+def test_refresher_needs_its_own_token(store, monkeypatch):
+    monkeypatch.setattr(query_store_module, "QUERY_STORE_DBT_TOKEN", "")
+    store.start_refresher(mcp_service.materialize_popular_queries)
+    assert store._refresher is None
+
+
+def test_materialization_uses_the_refresher_token(store, monkeypatch):
+    monkeypatch.setattr(mcp_service, "QUERY_STORE_DBT_TOKEN", "service-token")
+    store.record("http://mcp|1", {"metrics": ["revenue"]})
+    store.register_source("http://mcp|1", CONFIG, "v1")
+    clients = []
+
+    class FakeClient:
+        def __init__(self, environments, use_query_store=True):
+            self.environments = environments
+            self.server_catalog_versions = {}
+            clients.append(self)
+
+        async def connect(self):
+            return self
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(mcp_service, "RemoteMCPClient", FakeClient)
+    asyncio.run(mcp_service.materialize_popular_queries("http://mcp|1", store._sources["http://mcp|1"]["config"]))
+
+    assert clients[0].environments["dbt"]["headers"]["Authorization"] == "token service-token"
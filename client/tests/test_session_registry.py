@@ -0,0 +1,46 @@
+import asyncio
+import time
+from unittest import mock
+
+from services.session_registry import Runtime, SessionRegistry
+
+
+def _idle_session(registry):
+    state = {"history_chats": [{"messages": [{"role": "user", "content": "hi"}]}],
+             "messages": [{"role": "user", "content": "hi"}],
+             "loop": asyncio.new_event_loop(), "client": None}
+    registry.touch("session", state)
+    time.sleep(0.02)
+    return state
+
+
+def _runtime(active):
+    runtime = mock.Mock()
+    runtime.is_active_session.return_value = active
+    return mock.patch.multiple(Runtime, exists=mock.Mock(return_value=True), instance=mock.Mock(return_value=runtime))
+
+
+def test_idle_open_tab_keeps_its_history():
+    registry = SessionRegistry(idle_timeout=0.01, reap_interval=1000)
+    state = _idle_session(registry)
+
+    with _runtime(active=True):
+        assert registry.reap_idle() == 1
+        assert registry.reap_idle() == 0
+
+    assert "loop" not in state and state["session_expired"]
+    assert state["history_chats"] and state["messages"]
+    assert len(registry.snapshot()) == 1
+
+
+def test_disconnected_session_releases_its_history():
+    registry = SessionRegistry(idle_timeout=0.01, reap_interval=1000)
+    state = _idle_session(registry)
+
+    with _runtime(active=True):
+        registry.reap_idle()
+    with _runtime(active=False):
+        assert registry.reap_idle() == 1
+
+    assert "history_chats" not in state and "messages" not in state
+    assert registry.snapshot() == []
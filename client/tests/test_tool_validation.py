@@ -0,0 +1,38 @@
+import json
+
+from mcp.types import CallToolResult, TextContent
+
+from services.mcp_service import _result_to_text
+from services.tool_validation import ToolArgumentValidator
+
+
+def _learn_list_metrics(validator, result):
+    validator.learn("dbt", "list_metrics", {}, _result_to_text(result))
+
+
+def test_multi_content_list_metrics_is_learned():
+    # FastMCP serves list[Model] as one text block per item
+    result = CallToolResult(content=[
+        TextContent(type="text", text=json.dumps({"name": "revenue", "type": "SIMPLE"})),
+        TextContent(type="text", text=json.dumps({"name": "orders", "type": "SIMPLE"})),
+    ])
+    validator = ToolArgumentValidator()
+    _learn_list_metrics(validator, result)
+
+    assert validator.validate("dbt", "query_metrics", {"metrics": ["revenue"]}) is None
+    assert "Unknown metric 'revnue'" in validator.validate("dbt", "query_metrics", {"metrics": ["revnue"]})
+
+
+def test_empty_list_metrics_fails_open():
+    validator = ToolArgumentValidator()
+    _learn_list_metrics(validator, CallToolResult(content=[]))
+
+    assert validator.validate("dbt", "query_metrics", {"metrics": ["revenue"]}) is None
+
+
+def test_unparseable_list_metrics_fails_open():
+    validator = ToolArgumentValidator()
+    validator.learn("dbt", "list_metrics", {}, "Metrics: revenue, orders")
+    validator.learn("dbt", "list_metrics", {}, json.dumps(["not json", 3]))
+
+    assert validator.validate("dbt", "get_dimensions", {"metrics": ["revenue"]}) is None
@@ -2,7 +2,10 @@ import streamlit as st
 import traceback
 import os
 from services.mcp_service import connect_to_mcp_servers
-from services.chat_service import create_chat, delete_chat
+from services.chat_search import chat_search
+from services.chat_service import create_chat, delete_chat, get_owner_id, open_chat
+from services.session_registry import session_registry
+from utils.instrumentation import get_counters
 from utils.tool_schema_parser import extract_tool_parameters
 from utils.async_helpers import reset_connection_state
 
@@ -39,6 +42,34 @@ def create_history_chat_container():
             if current_chat:
                 st.session_state['current_chat_id'] = current_chat.split("_::_")[1]
 
+def create_chat_search_widget():
+    """Full-text search over the user's messages and tool outputs; a hit opens its chat"""
+    if not chat_search.available:
+        return
+
+    query = st.sidebar.text_input(
+        "Search chats",
+        key="chat_search_query",
+        placeholder="🔍 Search messages and tool outputs",
+        label_visibility="collapsed",
+    )
+    if not query:
+        return
+
+    hits = chat_search.search(get_owner_id(), query)
+    if not hits:
+        st.sidebar.caption("No matching chats")
+    for i, hit in enumerate(hits):
+        icon = "🛠️" if hit["kind"] == "tool" else "💬"
+        snippet = " ".join(hit["snippet"].split())
+        st.sidebar.button(
+            f"{icon} {hit['chat_name']}: {snippet}",
+            key=f"chat-search-hit-{i}",
+            on_click=open_chat,
+            args=(hit["chat_id"],),
+            use_container_width=True,
+        )
+
 def create_sidebar_chat_buttons():
     with st.sidebar:
         c1, c2 = st.columns(2)
@@ -65,6 +96,7 @@ def create_chat_history_section():
         
     # Only create history container if session is properly initialized
     if "history_chats" in st.session_state:
+        create_chat_search_widget()
         create_history_chat_container()
     
     # Chat management buttons
@@ -129,6 +161,14 @@ def create_mcp_configuration_widget():
                 key="dbt_env_id",
                 help="Found in dbt Cloud → Orchestration page"
             )
+            extra_environments = st.text_input(
+                "Additional Environments (optional)",
+                key="dbt_extra_environments",
+                placeholder="staging=12345, emea=678@emea.dbt.com",
+                help="Comma-separated name=environment_id pairs, optionally with @host. "
+                     "All environments are connected at once; tools are prefixed with the environment name."
+            )
+            os.environ['DBT_ENVIRONMENTS'] = extra_environments
             
             # Credential validation feedback
             if dbt_token and dbt_env_id:
@@ -155,6 +195,11 @@ def create_mcp_connection_status_widget():
             # Connection details
             st.markdown("**Connection Details:**")
             st.markdown("• **Status:** ✅ Active")
+            tool_counts = {}
+            for tool in st.session_state.get("tools", []):
+                tool_counts[tool.get("server")] = tool_counts.get(tool.get("server"), 0) + 1
+            for name in st.session_state.get("servers", {}):
+                st.markdown(f"• **{name}:** {tool_counts.get(name, 0)} tools")
                         
             # Disconnect section
             st.markdown("---")
@@ -226,4 +271,34 @@ def create_mcp_tools_widget():
                         if parameters:
                             st.write("**Parameters:**")
                             for param in parameters:
-                                st.code(param)
\ No newline at end of file
+                                st.code(param)
+
+def create_admin_sessions_widget():
+    """Admin view of live sessions and their memory footprint, shown when ADMIN_VIEW_ENABLED is set"""
+    if os.getenv("ADMIN_VIEW_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return
+
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("🩺 Live Sessions", expanded=False):
+            rows = session_registry.snapshot()
+            st.caption(
+                f"{len(rows)} live session(s) · idle sessions are released after "
+                f"{int(session_registry.idle_timeout)}s"
+            )
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+
+            sections = [
+                ("MCP transport", "mcp_http."),
+                ("Hedged requests", "mcp_hedge."),
+                ("Materialized queries", "query_store."),
+                ("Tool argument checks", "tool_validation."),
+                ("Post-processing workers", "postprocess."),
+            ]
+            for title, prefix in sections:
+                counters = get_counters(prefix)
+                if counters:
+                    st.markdown(f"**{title}**")
+                    for name, value in counters.items():
+                        st.markdown(f"• {name.split('.', 1)[1]}: {value}")
@@ -2,7 +2,7 @@ import streamlit as st
 import asyncio
 import warnings
 import sys
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 
 @contextmanager
 def suppress_async_warnings():
@@ -40,12 +40,14 @@ def run_async(coro):
     asyncio.set_event_loop(loop)
     
     try:
-        # Use a task to run the coroutine with better cleanup
-        task = loop.create_task(coro)
-        
-        # Suppress async cleanup warnings
-        with suppress_async_warnings():
-            result = loop.run_until_complete(task)
+        # Hold the session's loop lock so the idle reaper never closes the loop mid-request
+        with st.session_state.get("loop_lock") or nullcontext():
+            # Use a task to run the coroutine with better cleanup
+            task = loop.create_task(coro)
+
+            # Suppress async cleanup warnings
+            with suppress_async_warnings():
+                result = loop.run_until_complete(task)
         
         return result
     except Exception as e:
@@ -69,32 +71,4 @@ def reset_connection_state():
     st.session_state.client = None
     st.session_state.agent = None
     st.session_state.tools = []
-
-def on_shutdown():
-    """Proper cleanup when the session ends."""
-    try:
-        if hasattr(st.session_state, 'client') and st.session_state.client is not None:
-            # Close the client properly, ignoring event loop errors
-            try:
-                with suppress_async_warnings():
-                    run_async(st.session_state.client.close())
-            except RuntimeError:
-                # Event loop errors during shutdown are expected
-                pass
-    except Exception:
-        # During shutdown, we can't use st.error, so just pass
-        pass
-    finally:
-        # Close the event loop if it exists
-        try:
-            if hasattr(st.session_state, 'loop') and st.session_state.loop:
-                # Cancel all pending tasks
-                with suppress_async_warnings():
-                    pending = asyncio.all_tasks(st.session_state.loop)
-                    for task in pending:
-                        task.cancel()
-                    # Close the loop
-                    if not st.session_state.loop.is_closed():
-                        st.session_state.loop.close()
-        except Exception:
-            pass
\ No newline at end of file
+    st.session_state.servers = {}
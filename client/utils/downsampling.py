@@ -0,0 +1,239 @@
+import io
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Points kept per chart, and points handed to the model next to the summary
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "500"))
+TIMESERIES_MODEL_POINTS = int(os.getenv("TIMESERIES_MODEL_POINTS", "100"))
+# "lttb", "minmax", or "auto" (LTTB for a single metric, min/max bucketing for several)
+TIMESERIES_DOWNSAMPLE_METHOD = os.getenv("TIMESERIES_DOWNSAMPLE_METHOD", "auto")
+# Fewest rows kept per group; groups beyond points // this are folded into one "other" group
+_MIN_GROUP_POINTS = 3
+OTHER_GROUP = "(other)"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points that keep the shape of y(x)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # Interior points are split into threshold - 2 buckets; first and last points are always kept
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # The average of the next bucket (or the last point) is the third vertex of the triangle
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return np.unique(selected)
+
+
+def minmax_indices(values: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Indices of the min and max of every column within each of ``n_buckets`` equal-width buckets."""
+    n = values.shape[0]
+    if n_buckets <= 0 or 2 * n_buckets * values.shape[1] >= n:
+        return np.arange(n)
+
+    buckets = np.minimum(np.arange(n) * n_buckets // n, n_buckets - 1)
+    # First index of each bucket in the (bucket, value) sort order is the min, last is the max
+    bucket_starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    bucket_ends = np.r_[bucket_starts[1:], n] - 1
+    keep = [np.array([0, n - 1])]
+    for column in values.T:
+        order = np.lexsort((np.nan_to_num(column, nan=np.inf), buckets))
+        keep.append(order[bucket_starts])
+        keep.append(order[bucket_ends])
+    return np.unique(np.concatenate(keep))
+
+
+def parse_time_series(text: str) -> Optional[Dict]:
+    """Detect a query_metrics result made of rows with one time column and numeric metrics."""
+    try:
+        rows = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(rows, dict):
+        rows = rows.get("data") or rows.get("rows")
+    if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+        return None
+
+    df = pd.DataFrame.from_records(rows)
+    time_cols = [c for c in df.columns if "metric_time" in str(c).lower()]
+    if not time_cols:
+        return None
+    time_col = time_cols[0]
+    times = pd.to_datetime(df[time_col], errors="coerce", utc=True)
+    if times.isna().all():
+        return None
+
+    value_cols = [c for c in df.columns if c != time_col and pd.api.types.is_numeric_dtype(df[c])]
+    if not value_cols:
+        return None
+    group_cols = [c for c in df.columns if c not in value_cols and c != time_col]
+
+    df = df.assign(**{time_col: times}).sort_values([*group_cols, time_col], kind="stable")
+    return {"frame": df.reset_index(drop=True), "time_col": time_col,
+            "value_cols": value_cols, "group_cols": group_cols}
+
+
+def fold_groups(series: Dict, max_groups: int) -> Dict:
+    """Keep the ``max_groups - 1`` largest groups and sum the rest into one "other" group.
+
+    Groups are ranked by their total of the first metric. The folded group has one row
+    per timestamp, so the number of series stays bounded however many groups there are.
+    """
+    df, time_col, value_cols, group_cols = (
+        series["frame"], series["time_col"], series["value_cols"], series["group_cols"]
+    )
+    if not group_cols:
+        return series
+    keys = df.groupby(group_cols, sort=False, dropna=False).ngroup()
+    n_groups = int(keys.max()) + 1
+    if n_groups <= max_groups:
+        return series
+
+    totals = df[value_cols[0]].groupby(keys).sum()
+    is_top = keys.isin(totals.nlargest(max_groups - 1).index)
+    rest = df[~is_top].groupby(time_col, sort=True)[value_cols].sum(min_count=1).reset_index()
+    rest = rest.assign(**{col: OTHER_GROUP for col in group_cols})[df.columns]
+    return {**series, "frame": pd.concat([df[is_top], rest], ignore_index=True),
+            "folded_groups": n_groups - (max_groups - 1)}
+
+
+def downsample(series: Dict, max_points: int, method: str = TIMESERIES_DOWNSAMPLE_METHOD) -> pd.DataFrame:
+    """Reduce every group of the series to roughly ``max_points`` rows in total."""
+    df, time_col, value_cols = series["frame"], series["time_col"], series["value_cols"]
+    # dropna=False keeps rows whose group column is null as a group of their own
+    groups = (
+        [g for _, g in df.groupby(series["group_cols"], sort=False, dropna=False)]
+        if series["group_cols"] else [df]
+    )
+    budget = max(max_points // len(groups), _MIN_GROUP_POINTS)
+    if method == "auto":
+        method = "lttb" if len(value_cols) == 1 else "minmax"
+
+    parts = []
+    for group in groups:
+        if len(group) <= budget:
+            parts.append(group)
+            continue
+        values = group[value_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        if method == "lttb":
+            x = group[time_col].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            indices = lttb_indices(x, np.nan_to_num(values[:, 0]), budget)
+        else:
+            indices = minmax_indices(values, max(budget // (2 * len(value_cols)), 1))
+        parts.append(group.iloc[indices])
+    return pd.concat(parts, ignore_index=True)
+
+
+def summarize(series: Dict) -> Dict:
+    """Compact statistics of the full-resolution series, for the model."""
+    df, time_col = series["frame"], series["time_col"]
+    times = df[time_col]
+    summary = {
+        "rows": len(df),
+        "time_column": time_col,
+        "start": times.min().isoformat(),
+        "end": times.max().isoformat(),
+        "group_by": series["group_cols"],
+        "metrics": {},
+    }
+    for col in series["value_cols"]:
+        values = df[col]
+        summary["metrics"][col] = {
+            "min": _scalar(values.min()), "max": _scalar(values.max()),
+            "mean": _scalar(round(values.mean(), 4)), "sum": _scalar(values.sum()),
+            "first": _scalar(values.iloc[0]), "last": _scalar(values.iloc[-1]),
+        }
+    if series["group_cols"]:
+        totals = df.groupby(series["group_cols"], dropna=False)[series["value_cols"]].sum()
+        summary["groups"] = len(totals)
+        summary["top_groups"] = json.loads(
+            totals.sort_values(series["value_cols"][0], ascending=False).head(10).reset_index().to_json(orient="records")
+        )
+    return summary
+
+
+def _scalar(value):
+    # NaN is not valid JSON; the model gets null instead
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def to_records(df: pd.DataFrame) -> List[Dict]:
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def chart_records(df: pd.DataFrame, time_col: str, value_cols: List[str], group_cols: List[str]) -> List[Dict]:
+    """Long-format rows (time, series, value) that st.line_chart draws as one line per series."""
+    long = df.melt(id_vars=[time_col, *group_cols], value_vars=value_cols,
+                   var_name="metric", value_name="value")
+    long["series"] = long["metric"]
+    if group_cols:
+        long["series"] += " · " + long[group_cols].astype(str).agg(" / ".join, axis=1)
+    return to_records(long[[time_col, "series", "value"]])
+
+
+def reduce_tool_output(text: str, max_points: int = TIMESERIES_MAX_POINTS,
+                       model_points: int = TIMESERIES_MODEL_POINTS) -> Optional[Dict]:
+    """Downsample a large time-series tool output.
+
+    Returns None when the output is not a time series or is already small. Otherwise
+    returns the text for the model (summary plus a coarse series), the chart series
+    and the full-resolution data as CSV for download.
+    """
+    series = parse_time_series(text)
+    if series is None or len(series["frame"]) <= max_points:
+        return None
+
+    # Too many groups to keep a few points of each: the smallest ones become "other"
+    chart_series = fold_groups(series, max(max_points // _MIN_GROUP_POINTS, 1))
+    model_series = fold_groups(series, max(model_points // _MIN_GROUP_POINTS, 1))
+    chart = downsample(chart_series, max_points)
+    coarse = downsample(model_series, model_points)
+    note = f"Time series downsampled from {len(series['frame'])} to {len(coarse)} rows. "
+    if model_series.get("folded_groups"):
+        note += (f"The {model_series['folded_groups']} smallest groups are summed into "
+                 f"the group \"{OTHER_GROUP}\"; the summary covers all groups. ")
+    model_text = json.dumps({
+        "summary": summarize(series),
+        "downsampled_rows": to_records(coarse),
+        "note": note + "The user sees a chart of the series and can download the full data.",
+    })
+
+    csv = io.StringIO()
+    series["frame"].to_csv(csv, index=False)
+    return {
+        "model_text": model_text,
+        "chart": {
+            "rows": chart_records(chart, series["time_col"], series["value_cols"], series["group_cols"]),
+            "points": len(chart),
+            "time_col": series["time_col"],
+            "value_cols": series["value_cols"],
+            "group_cols": series["group_cols"],
+            "full_row_count": len(series["frame"]),
+        },
+        "full_csv": csv.getvalue(),
+    }
@@ -0,0 +1,24 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# Process-wide counters, named "<area>.<event>" (e.g. "mcp_http.connections_reused")
+_counters: Dict[str, int] = defaultdict(int)
+_lock = threading.Lock()
+
+
+def increment(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] += amount
+
+
+def get_counters(prefix: str = "") -> Dict[str, int]:
+    """Snapshot of all counters whose name starts with prefix."""
+    with _lock:
+        return {k: v for k, v in sorted(_counters.items()) if k.startswith(prefix)}
+
+
+def reset_counters(prefix: str = "") -> None:
+    with _lock:
+        for key in [k for k in _counters if k.startswith(prefix)]:
+            del _counters[key]
@@ -0,0 +1,118 @@
+import os
+import sys
+import types
+import atexit
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+from utils.instrumentation import increment
+
+# CPU-heavy post-processing runs in worker processes so it never holds the GIL of the
+# Streamlit server; 0 workers processes everything inline
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Outputs smaller than this are cheaper to process inline than to ship to a worker
+POSTPROCESS_MIN_BYTES = int(os.getenv("POSTPROCESS_MIN_BYTES", str(256 * 1024)))
+# Outputs at least this large are handed over through shared memory instead of the pipe
+POSTPROCESS_SHM_MIN_BYTES = int(os.getenv("POSTPROCESS_SHM_MIN_BYTES", str(1024 * 1024)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+# Set in each worker: released once every worker of the pool has started
+_all_started = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Spawned, not forked: forking the multi-threaded server process is unsafe
+            context = multiprocessing.get_context("spawn")
+            _executor = ProcessPoolExecutor(
+                max_workers=POSTPROCESS_WORKERS, mp_context=context,
+                initializer=_init_worker, initargs=(context.Barrier(POSTPROCESS_WORKERS),),
+            )
+            # Streamlit runs the app script as __main__, and spawned workers would re-run
+            # it on start. A submit spawns a worker when none is idle, so start them all
+            # now, once, with __main__ hidden: each warm-up task waits until every worker
+            # is up, so no worker is idle and every submit spawns one. The pool never
+            # starts more; a worker that dies breaks the pool, which is then rebuilt.
+            main = sys.modules["__main__"]
+            placeholder = sys.modules["__main__"] = types.ModuleType("__main__")
+            try:
+                for _ in range(POSTPROCESS_WORKERS):
+                    _executor.submit(_wait_for_all_workers)
+            finally:
+                # A rerun may have installed a new __main__ meanwhile; leave that one in place
+                if sys.modules.get("__main__") is placeholder:
+                    sys.modules["__main__"] = main
+            atexit.register(shutdown)
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _init_worker(all_started) -> None:
+    global _all_started
+    _all_started = all_started
+
+
+def _wait_for_all_workers() -> None:
+    _all_started.wait(timeout=60)
+
+
+def _call_with_text(func: Callable[[str], Any], text: str) -> Any:
+    return func(text)
+
+
+def _call_with_shared_text(func: Callable[[str], Any], name: str, size: int) -> Any:
+    # Decode straight from the shared buffer; the bytes never go through the pipe
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        text = str(block.buf[:size], "utf-8")
+    finally:
+        block.close()
+    return func(text)
+
+
+async def process_text(func: Callable[[str], Any], text: str) -> Any:
+    """Run ``func(text)`` in the worker pool and return its result.
+
+    ``func`` must be a module-level function so workers can import it. Small inputs,
+    or all inputs when the pool is disabled, are processed inline.
+    """
+    if POSTPROCESS_WORKERS <= 0 or len(text) < POSTPROCESS_MIN_BYTES:
+        return func(text)
+
+    data = text.encode("utf-8")
+    block = None
+    try:
+        if len(data) >= POSTPROCESS_SHM_MIN_BYTES:
+            block = shared_memory.SharedMemory(create=True, size=len(data))
+            block.buf[:len(data)] = data
+            call = (_call_with_shared_text, func, block.name, len(data))
+            increment("postprocess.shared_memory_bytes", len(data))
+        else:
+            call = (_call_with_text, func, text)
+        result = await asyncio.get_running_loop().run_in_executor(_get_executor(), *call)
+        increment("postprocess.offloaded")
+        return result
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool next time
+        shutdown()
+        increment("postprocess.pool_failures")
+        return func(text)
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()